@@ -31,8 +31,10 @@ logging.getLogger(__name__).addHandler(logging.NullHandler())
 
 def get_release_controller(**kwargs: Any) -> ReleaseController:
     """Create and return a release controller."""
+    repo_dir = kwargs.pop('repo_dir', REPO_DIR)
+    if repo_dir is None:
+        raise VersioningException('Unable to locate git repository.')
     try:
-        repo_dir = kwargs.pop('repo_dir', REPO_DIR)
         repo = Git(Repository(repo_dir))
 
         config_files = kwargs.pop('config_files', CONFIG_FILES)
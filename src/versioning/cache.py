@@ -0,0 +1,298 @@
+# copyright: (c) 2021 by Jesse Johnson.
+# license: LGPL-3.0, see LICENSE.md for more details.
+"""Cache parsed commit messages by commit id."""
+
+import json
+import logging
+import os
+import sqlite3
+import time
+from typing import Any, Dict, Optional, Tuple, TypeVar
+
+from versioning.config import GRAMMAR_PATH
+from versioning.grammars.conventional_commits import (
+    HEADER_PATTERNS,
+    ParsedCommit,
+)
+from versioning.grammars.registry import get_cache_key
+
+log = logging.getLogger(__name__)
+
+CACHE_MAX_ENTRIES = 250000
+
+DatabaseType = TypeVar('DatabaseType', bound='Database')
+
+
+def get_cache_path(repo_dir: str, filename: str = 'commits.db') -> str:
+    """Get path of a cache file within the git directory."""
+    return os.path.join(repo_dir, 'versioning', filename)
+
+
+def get_commit_cache(
+    repo_dir: str,
+    grammar_path: str = GRAMMAR_PATH,
+    parser: str = 'earley',
+    **kwargs: Any,
+) -> 'CommitCache':
+    """Get cache of commits classified from their headers.
+
+    Commits are keyed by the grammar, the parser and the header patterns
+    used to classify them, so changing any of them does not serve stale
+    classifications.
+    """
+    return CommitCache(
+        get_cache_path(repo_dir),
+        grammar=get_cache_key(
+            grammar_path,
+            header_only=True,
+            parser=parser,
+            header=HEADER_PATTERNS,
+            fields=ParsedCommit.__slots__,
+        ),
+        **kwargs,
+    )
+
+
+def _dump_commit(commit: ParsedCommit) -> str:
+    """Serialize parsed commit."""
+    return json.dumps(commit.__getstate__())
+
+
+def _load_commit(data: str) -> ParsedCommit:
+    """Deserialize parsed commit."""
+    (
+        kind,
+        scope,
+        breaking,
+        description,
+        body,
+        issues,
+        trailers,
+        breaking_change,
+        degraded,
+    ) = json.loads(data)
+    return ParsedCommit(
+        type=kind,
+        scope=scope,
+        breaking=breaking,
+        description=description,
+        body=tuple(body),
+        issues=tuple(tuple(x) for x in issues),
+        trailers=tuple(tuple(x) for x in trailers),
+        breaking_change=breaking_change,
+        degraded=degraded,
+    )
+
+
+class Database:
+    """Open a sqlite database on first use and create its tables.
+
+    Statements creating the tables of a database are listed in `schema`.
+    """
+
+    schema: Tuple[str, ...] = ()
+
+    def __init__(self, path: str) -> None:
+        """Initialize database."""
+        self.path = path
+        self._connection: Optional[sqlite3.Connection] = None
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        """Get connection to database."""
+        if self._connection is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._connection = sqlite3.connect(self.path)
+            for statement in self.schema:
+                self._connection.execute(statement)
+        return self._connection
+
+    def __enter__(self: DatabaseType) -> DatabaseType:
+        """Open database."""
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        """Save changes and close database."""
+        self.close()
+
+    def close(self) -> None:
+        """Save changes and close connection to database."""
+        if self._connection is not None:
+            self._connection.commit()
+            self._connection.close()
+            self._connection = None
+
+
+class CommitCache(Database):
+    """Persist parsed commits keyed by commit id and grammar version.
+
+    Rendered changelog sections of releases are kept alongside so that
+    earlier releases are not categorized again.
+    """
+
+    schema = (
+        (
+            'CREATE TABLE IF NOT EXISTS commits ('
+            ' oid TEXT NOT NULL,'
+            ' grammar TEXT NOT NULL,'
+            ' data TEXT NOT NULL,'
+            ' accessed REAL NOT NULL,'
+            ' PRIMARY KEY (oid, grammar)'
+            ')'
+        ),
+        (
+            'CREATE INDEX IF NOT EXISTS commits_accessed'
+            ' ON commits (accessed)'
+        ),
+        (
+            'CREATE TABLE IF NOT EXISTS releases ('
+            ' name TEXT NOT NULL,'
+            ' grammar TEXT NOT NULL,'
+            ' format TEXT NOT NULL,'
+            ' oid TEXT NOT NULL,'
+            ' section TEXT NOT NULL,'
+            ' PRIMARY KEY (name, grammar, format)'
+            ')'
+        ),
+        (
+            'CREATE TABLE IF NOT EXISTS state ('
+            ' name TEXT NOT NULL PRIMARY KEY,'
+            ' value TEXT NOT NULL'
+            ')'
+        ),
+    )
+
+    def __init__(
+        self,
+        path: str,
+        grammar: str,
+        max_entries: int = CACHE_MAX_ENTRIES,
+    ) -> None:
+        """Initialize commit cache."""
+        super().__init__(path)
+        self.grammar = grammar
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, oid: str) -> Optional[ParsedCommit]:
+        """Get parsed commit from cache."""
+        row = self.connection.execute(
+            'SELECT data FROM commits WHERE oid = ? AND grammar = ?',
+            (oid, self.grammar),
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.connection.execute(
+            'UPDATE commits SET accessed = ? WHERE oid = ? AND grammar = ?',
+            (time.time(), oid, self.grammar),
+        )
+        return _load_commit(row[0])
+
+    def set(self, oid: str, commit: ParsedCommit) -> None:
+        """Add parsed commit to cache."""
+        self.connection.execute(
+            'INSERT OR REPLACE INTO commits VALUES (?, ?, ?, ?)',
+            (oid, self.grammar, _dump_commit(commit), time.time()),
+        )
+
+    def get_release(
+        self, name: str, oid: str, fmt: str = 'markdown'
+    ) -> Optional[str]:
+        """Get rendered changelog section of a release."""
+        row = self.connection.execute(
+            'SELECT section FROM releases'
+            ' WHERE name = ? AND grammar = ? AND format = ? AND oid = ?',
+            (name, self.grammar, fmt, oid),
+        ).fetchone()
+        return row[0] if row else None
+
+    def has_release(self, name: str, oid: str, fmt: str = 'markdown') -> bool:
+        """Check if changelog section of a release is cached."""
+        return (
+            self.connection.execute(
+                'SELECT 1 FROM releases'
+                ' WHERE name = ? AND grammar = ? AND format = ? AND oid = ?',
+                (name, self.grammar, fmt, oid),
+            ).fetchone()
+            is not None
+        )
+
+    def set_release(
+        self, name: str, oid: str, section: str, fmt: str = 'markdown'
+    ) -> None:
+        """Add rendered changelog section of a release to cache."""
+        self.connection.execute(
+            'INSERT OR REPLACE INTO releases VALUES (?, ?, ?, ?, ?)',
+            (name, self.grammar, fmt, oid, section),
+        )
+
+    def get_state(self, name: str) -> Optional[str]:
+        """Get value recorded by a previous run."""
+        row = self.connection.execute(
+            'SELECT value FROM state WHERE name = ?', (name,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def set_state(self, name: str, value: str) -> None:
+        """Record value for later runs."""
+        self.connection.execute(
+            'INSERT OR REPLACE INTO state VALUES (?, ?)', (name, value)
+        )
+
+    def flush(self) -> None:
+        """Evict least recently used commits and save changes."""
+        if self._connection is None:
+            return
+        (count,) = self.connection.execute(
+            'SELECT COUNT(*) FROM commits'
+        ).fetchone()
+        if count > self.max_entries:
+            self.connection.execute(
+                'DELETE FROM commits WHERE rowid IN ('
+                ' SELECT rowid FROM commits ORDER BY accessed, rowid LIMIT ?'
+                ')',
+                (count - self.max_entries,),
+            )
+            log.debug(
+                'evicted %d commits from cache', count - self.max_entries
+            )
+        self.connection.commit()
+
+    def close(self) -> None:
+        """Evict commits, save changes and close connection to database."""
+        if self._connection is not None:
+            self.flush()
+        super().close()
+
+    def clear(self) -> None:
+        """Remove all commits from cache."""
+        self.connection.execute('DELETE FROM commits')
+        self.connection.execute('DELETE FROM releases')
+        self.connection.execute('DELETE FROM state')
+        self.connection.commit()
+        self.connection.execute('VACUUM')
+
+    def stats(self) -> Dict[str, Any]:
+        """Get statistics of cache."""
+        (entries,) = self.connection.execute(
+            'SELECT COUNT(*) FROM commits'
+        ).fetchone()
+        (current,) = self.connection.execute(
+            'SELECT COUNT(*) FROM commits WHERE grammar = ?', (self.grammar,)
+        ).fetchone()
+        (releases,) = self.connection.execute(
+            'SELECT COUNT(*) FROM releases WHERE grammar = ?', (self.grammar,)
+        ).fetchone()
+        return {
+            'path': self.path,
+            'size': os.path.getsize(self.path),
+            'entries': entries,
+            'current_entries': current,
+            'max_entries': self.max_entries,
+            'releases': releases,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
@@ -1,121 +1,409 @@
 """Manage changelog using pygit2."""
 
+import hashlib
 import logging
-import re
+import os
+import shutil
 from collections import deque
-from datetime import datetime
-from typing import TYPE_CHECKING, Any, Dict, Generator, List, Tuple
+from contextlib import nullcontext
+from typing import (
+    IO,
+    TYPE_CHECKING,
+    Any,
+    ContextManager,
+    Deque,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    TypeVar,
+    Union,
+)
 
-from mdutils.mdutils import MdUtils  # pylint: disable=import-error
+from pygit2 import Commit
+from pygit2.enums import SortMode
 
 from versioning.config import COMMIT_TYPES  # SCOPES
-from versioning.grammars.conventional_commits import CommitMessageParser
+from versioning.files import atomic_write
+from versioning.grammars.conventional_commits import (
+    CommitMessageParser,
+    ParsedCommit,
+    ParseStats,
+)
+from versioning.profiling import MemoryProfiler
+from versioning.releases import get_release_index
+from versioning.renderers import Changes, Renderer, get_renderer
+from versioning.vcs import ReleaseTag, TagIndex
 
 if TYPE_CHECKING:
-    from pygit2 import Commit, Repository
+    from pygit2 import Repository
 
-logging.getLogger(__name__).addHandler(logging.NullHandler())
+    from versioning.cache import CommitCache
+
+log = logging.getLogger(__name__)
+log.addHandler(logging.NullHandler())
+
+CHUNK_SIZE = 65536
+
+T = TypeVar('T')
 
 
 class Changelog:
     """Manage changelog file."""
 
-    def __init__(self, repo: 'Repository') -> None:
+    def __init__(
+        self,
+        repo: 'Repository',
+        cache: Optional['CommitCache'] = None,
+        parser: Optional[CommitMessageParser] = None,
+        workers: int = 1,
+        renderer: Union[str, Renderer] = 'markdown',
+        profiler: Optional[MemoryProfiler] = None,
+    ) -> None:
         """Initialize changelog."""
         self.repo = repo
+        self.cache = cache
+        self.parser = parser or CommitMessageParser()
+        self.workers = workers
+        self.renderer = (
+            get_renderer(renderer) if isinstance(renderer, str) else renderer
+        )
+        self.stats = ParseStats()
+        self.profiler = profiler
+
+    def _phase(self, name: str) -> ContextManager[Any]:
+        """Profile memory of a phase when profiling is enabled."""
+        return self.profiler.phase(name) if self.profiler else nullcontext()
+
+    def _track(self, name: str, iterable: Iterable[T]) -> Iterable[T]:
+        """Profile memory allocated by each step of an iterable."""
+        return (
+            self.profiler.track(name, iterable) if self.profiler else iterable
+        )
 
     @property
-    def tags(self) -> Generator['Commit', None, None]:
-        """Get tagged commit."""
-        # iterate tags and add each commit since preious tag to a section
-        regex = re.compile('^refs/tags/')
-        tags = [r for r in self.repo.references if regex.match(r)]
-        for tag in tags:
-            yield self.repo.revparse_single(tag)
-
-    def _categorize_commit(self, commit: 'Commit') -> Tuple[str, List[str]]:
+    def tags(self) -> TagIndex:
+        """Get index of release tags."""
+        return TagIndex(self.repo)
+
+    def first_release(self, revision: str) -> Optional[str]:
+        """Get name of the first release containing a commit."""
+        with get_release_index(self.repo.path) as index:
+            return index.first_release(self.repo, revision)
+
+    @staticmethod
+    def _categorize_commit(
+        oid: str, parsed: ParsedCommit
+    ) -> Tuple[str, List[Any]]:
         """Get changes associated with a release."""
-        parser = CommitMessageParser()
-        parser.parse(commit.message.rstrip())
-        # scope = parser.title['scope']
-        row = [
-            str(commit.id),
-            parser.title['type'],
-            parser.title['description'],
-        ]
-
-        if parser.title['type'] == 'feat':
+        row = [oid, parsed.type, parsed.description]
+
+        if parsed.type == 'feat':
             section = 'added'
-        elif parser.title['type'] == 'fix':
+        elif parsed.type == 'fix':
             section = 'fixed'
-        elif parser.title['type'] in COMMIT_TYPES:
+        elif parsed.type in COMMIT_TYPES:
             section = 'changed'
         else:
             section = 'misc'
         return section, row
 
-    def generate_changelog(self) -> None:
-        """Generate changelog."""
-        # iterate tags and add each commit since preious tag to a section
-        start_commit = self.repo.head.target
-
-        releases = []
-        commits = deque(self.repo.walk(start_commit))
-
-        for tag in self.tags:
-            tagged_commit = tag.get_object()
-            changes: Dict[str, List[str]] = {
-                'added': [],
-                'changed': [],
-                'deprecated': [],
-                'removed': [],
-                'fixed': [],
-                'security': [],
-                'misc': [],
-            }
-
-            while commits:
-                commit = commits.pop()
-                section, scope = self._categorize_commit(commit)
-                changes[section].extend(scope)
-                if tagged_commit == commit:
-                    break
-
-            releases.append(
-                {
-                    'name': tag.name,
-                    'time': tag.tagger.time,
-                    'changes': changes,
-                }
+    def _walk_releases(
+        self, releases: Iterable[Tuple[ReleaseTag, List[str]]]
+    ) -> Iterator[Tuple[ReleaseTag, Optional[Commit]]]:
+        """Walk commits of each release from oldest to newest.
+
+        A release covers the commits reachable from its tag that are not
+        reachable from the hidden commits of earlier releases. Each release
+        ends with `None`.
+        """
+        for release, hidden in releases:
+            walker = self.repo.walk(
+                release.oid, SortMode.TOPOLOGICAL | SortMode.REVERSE
             )
-        self._generate_document(releases)
-
-    def _generate_document(self, releases: List[Dict[str, Any]]) -> None:
-        """Generate changelog file."""
-        # stopgap until better parser is found
-        md = MdUtils(
-            file_name='CHANGELOG.md',
-            title='Changelog',
-            # author='Jesse P. Johnson'
-        )
-        md.new_header(level=1, title='ProMan Versioning Changelog')
-        sections = ['commit', 'type', 'description']
-
-        for release in reversed(releases):
-            dt = datetime.fromtimestamp(release['time'])
-            md.new_header(
-                level=2,
-                # title=f"[v{tag.name}]({url}) - ({dt.strftime('%Y-%m-%d')})"
-                title=f"v{release['name']} - ({dt.strftime('%Y-%m-%d')})",
+            for oid in hidden:
+                walker.hide(oid)
+            for commit in walker:
+                yield release, commit
+            yield release, None
+
+    def _categorize_releases(
+        self, releases: Iterable[Tuple[ReleaseTag, List[str]]], workers: int
+    ) -> Iterator[Tuple[ReleaseTag, Changes]]:
+        """Categorize commits of releases and yield them in release order."""
+        jobs: Deque[Tuple[ReleaseTag, Optional[str], bool]] = deque()
+
+        def messages() -> Iterator[Union[str, ParsedCommit]]:
+            for release, commit in self._track(
+                'walk', self._walk_releases(releases)
+            ):
+                if commit is None:
+                    jobs.append((release, None, False))
+                    continue
+                oid = str(commit.id)
+                cached = self.cache.get(oid) if self.cache else None
+                jobs.append((release, oid, cached is not None))
+                yield cached or commit.message.rstrip()
+
+        changes = self._new_changes()
+        for parsed in self._track(
+            'classify',
+            self.parser.parse_many(
+                messages(),
+                workers=workers,
+                header_only=True,
+                tolerant=True,
+                stats=self.stats,
+            ),
+        ):
+            while jobs[0][1] is None:
+                yield jobs.popleft()[0], changes
+                changes = self._new_changes()
+            _, oid, cached = jobs.popleft()
+            assert oid is not None  # nosec
+            # NOTE: degraded results depend on the limits and parse timeout
+            if self.cache and not cached and not parsed.degraded:
+                self.cache.set(oid, parsed)
+            section, row = self._categorize_commit(oid, parsed)
+            changes[section].append(row)
+        while jobs:
+            yield jobs.popleft()[0], changes
+            changes = self._new_changes()
+
+    def generate_changelog(
+        self,
+        since: Optional[str] = None,
+        workers: Optional[int] = None,
+        filepath: Optional[str] = None,
+    ) -> None:
+        """Generate changelog file.
+
+        The file is written through a temporary file that replaces it once
+        the changelog is complete.
+        """
+        with atomic_write(
+            filepath or self.renderer.filepath, encoding='utf-8'
+        ) as file:
+            self.write_changelog(file, since=since, workers=workers)
+
+    def write_changelog(
+        self,
+        file: IO[str],
+        since: Optional[str] = None,
+        workers: Optional[int] = None,
+    ) -> None:
+        """Write changelog to a file.
+
+        Sections rendered for earlier releases are reused, so only commits
+        after the last cached release, or after the `since` revision when
+        provided, are categorized. Releases up to `since` that are not
+        cached are categorized in full. Releases are split into ranges
+        bounded by their tags and categorized across `workers` processes.
+
+        Releases are processed from newest to oldest so each section is
+        written as soon as it is complete by the changelog renderer.
+        """
+        renderer = self.renderer
+        with self._phase('tags'):
+            index = self.tags
+            boundary = (
+                str(self.repo.revparse_single(since).peel(Commit).id)
+                if since is not None
+                else None
             )
 
-            for k, v in release['changes'].items():
-                if v != []:
-                    md.new_header(level=3, title=k)
-                    md.new_table(
-                        columns=len(sections),
-                        rows=len(sections + v) // len(sections),
-                        text=sections + v,
-                        text_align='left',
+            # NOTE: commits with several tags are released once
+            releases = index.distinct()
+            frontiers = index.frontiers(releases)
+            pending: Set[str] = set()
+            bounded: Set[str] = set()
+            for tag in releases:
+                if boundary is not None and not (
+                    tag.oid == boundary
+                    or self.repo.descendant_of(boundary, tag.oid)
+                ):
+                    bounded.add(tag.oid)
+                    released = False
+                else:
+                    # NOTE: uncached releases up to `since` are categorized
+                    released = (
+                        (boundary is not None or not pending)
+                        and self.cache is not None
+                        and self.cache.has_release(
+                            tag.name, tag.oid, renderer.name
+                        )
                     )
-        md.create_md_file()
+                if not released:
+                    pending.add(tag.oid)
+
+        extra = [boundary] if boundary else []
+        results = self._categorize_releases(
+            (
+                (x, frontiers[i] + (extra if x.oid in bounded else []))
+                for i, x in reversed(list(enumerate(releases)))
+                if x.oid in pending
+            ),
+            workers or self.workers,
+        )
+        with self._phase('render'):
+            file.write(renderer.header())
+            separator = ''
+            for release in reversed(releases):
+                if release.oid in pending:
+                    _, changes = next(results)
+                    section = renderer.release(release, changes)
+                    if self.cache:
+                        self.cache.set_release(
+                            release.name, release.oid, section, renderer.name
+                        )
+                else:
+                    cached = (
+                        self.cache.get_release(
+                            release.name, release.oid, renderer.name
+                        )
+                        if self.cache
+                        else None
+                    )
+                    if cached is None:
+                        log.warning(
+                            'skipping uncached release: %s', release.name
+                        )
+                        continue
+                    section = cached
+                file.write(separator + section)
+                separator = renderer.separator
+            file.write(renderer.footer())
+
+        with self._phase('flush'):
+            if self.cache:
+                self.cache.flush()
+        log.info('categorized commits: %s', self.stats.as_dict())
+
+    def _find_latest_release(
+        self, file: IO[str], releases: List[ReleaseTag]
+    ) -> Tuple[str, int, Optional[int]]:
+        """Find section of the newest release written to a changelog.
+
+        The file is only read until the first release section, so the
+        returned head holds the text up to and including its start.
+        """
+        renderer = self.renderer
+        size = max((len(renderer.marker(x)) for x in releases), default=0)
+        head = ''
+        while True:
+            chunk = file.read(CHUNK_SIZE)
+            head += chunk
+            position = head.find(renderer.section_start)
+            if position != -1 and (len(head) - position >= size or not chunk):
+                break
+            if not chunk:
+                return head, -1, None
+        for i, release in reversed(list(enumerate(releases))):
+            if head.startswith(renderer.marker(release), position):
+                return head, position, i
+        return head, position, None
+
+    def _state(self, filepath: str) -> Tuple[str, str]:
+        """Get name and key of the state a changelog was written from.
+
+        The key changes with HEAD, the tag references and the changelog file
+        itself, all of which are read without walking the history.
+        """
+        digest = hashlib.sha256()
+        if not self.repo.head_is_unborn:
+            digest.update(f"HEAD={self.repo.head.target}\n".encode('utf-8'))
+        for name in sorted(self.repo.listall_references()):
+            if name.startswith('refs/tags/'):
+                target = self.repo.references[name].target
+                digest.update(f"{name}={target}\n".encode('utf-8'))
+        if os.path.exists(filepath):
+            stat = os.stat(filepath)
+            digest.update(f"{stat.st_size}:{stat.st_mtime_ns}".encode('utf-8'))
+        path = os.path.abspath(filepath)
+        return f"changelog:{self.renderer.name}:{path}", digest.hexdigest()
+
+    def update_changelog(
+        self, workers: Optional[int] = None, filepath: Optional[str] = None
+    ) -> bool:
+        """Update changelog file with releases after its newest section.
+
+        Only sections of new releases are rendered and spliced in before the
+        newest release found in the file, the rest of which is copied as is.
+        The changelog is generated when the file has no known release.
+
+        When a cache is provided the update is skipped if neither HEAD, the
+        tags nor the file changed since the last update.
+        """
+        filepath = filepath or self.renderer.filepath
+        if self.cache:
+            name, key = self._state(filepath)
+            if self.cache.get_state(name) == key:
+                log.info('changelog is unchanged: %s', filepath)
+                return False
+        self._splice_changelog(workers, filepath)
+        if self.cache:
+            self.cache.set_state(*self._state(filepath))
+            self.cache.flush()
+        return True
+
+    def _splice_changelog(self, workers: Optional[int], filepath: str) -> None:
+        """Splice sections of new releases into changelog file."""
+        renderer = self.renderer
+        if not renderer.section_start or not os.path.exists(filepath):
+            return self.generate_changelog(workers=workers, filepath=filepath)
+
+        with self._phase('tags'):
+            index = self.tags
+            releases = index.distinct()
+            frontiers = index.frontiers(releases)
+        with open(filepath, encoding='utf-8', newline='') as source:
+            head, position, latest = self._find_latest_release(
+                source, releases
+            )
+            if latest is None:
+                log.info('no known release in changelog: %s', filepath)
+                return self.generate_changelog(
+                    workers=workers, filepath=filepath
+                )
+            if latest == len(releases) - 1:
+                log.info('changelog is up to date: %s', filepath)
+                return None
+
+            results = self._categorize_releases(
+                (
+                    (x, frontiers[i])
+                    for i, x in reversed(list(enumerate(releases)))
+                    if i > latest
+                ),
+                workers or self.workers,
+            )
+            with self._phase('render'), atomic_write(
+                filepath, encoding='utf-8'
+            ) as file:
+                file.write(head[:position])
+                for release, changes in results:
+                    section = renderer.release(release, changes)
+                    if self.cache:
+                        self.cache.set_release(
+                            release.name, release.oid, section, renderer.name
+                        )
+                    file.write(section + renderer.separator)
+                file.write(head[position:])
+                shutil.copyfileobj(source, file, CHUNK_SIZE)
+        log.info('categorized commits: %s', self.stats.as_dict())
+        return None
+
+    @staticmethod
+    def _new_changes() -> Changes:
+        """Get empty changes of a release."""
+        return {
+            'added': [],
+            'changed': [],
+            'deprecated': [],
+            'removed': [],
+            'fixed': [],
+            'security': [],
+            'misc': [],
+        }
@@ -2,14 +2,38 @@
 # license: LGPL-3.0, see LICENSE.md for more details.
 """Control project versions."""
 
+import json
 import logging
 import sys
-from typing import Optional
+from collections import deque
+from dataclasses import asdict
+from functools import lru_cache
+from itertools import chain, islice
+from typing import Deque, Iterator, Optional
 
-from versioning import get_release_controller
+from versioning import ReleaseController, get_release_controller
+from versioning.cache import get_commit_cache
+from versioning.config import get_parser_config
+from versioning.exception import VersioningException
+from versioning.grammars.conventional_commits import (
+    CommitMessageParser,
+    ParsedCommit,
+    ParseStats,
+)
+from versioning.grammars.registry import detect_profile
+from versioning.issues import get_issue_index
+from versioning.profiling import MemoryProfiler
+from versioning.releases import get_release_index
+from versioning.vcs import iter_log_records
 
 _log = logging.getLogger(__name__)
-_controller = get_release_controller()
+
+
+@lru_cache(maxsize=None)
+def _get_controller() -> ReleaseController:
+    """Get release controller of the current repository."""
+    # NOTE: created on first use so parsing works without a repository
+    return get_release_controller()
 
 
 def bump(
@@ -20,6 +44,7 @@ def bump(
     # sign: bool = False,
     release: bool = False,
     build: Optional[str] = None,
+    changelog: bool = False,
     dry_run: bool = False,
 ) -> None:
     """Update project version.
@@ -29,6 +54,8 @@ def bump(
     build: str
         Build version from other systems the may help coordinate build
         artifacts.
+    changelog: bool
+        Update the changelog once the version is applied.
     commit: bool
         Commit release changes to project.
     dry_run: bool
@@ -45,7 +72,8 @@ def bump(
     """
     # sign: bool
     #     Sign commit with PKI signature.
-    version = _controller.update_version(
+    controller = _get_controller()
+    version = controller.update_version(
         commit=commit,
         release=release,
         tag=tag,
@@ -55,6 +83,8 @@ def bump(
         build=build,
         dry_run=dry_run,
     )
+    if changelog:
+        controller.update_changelog(dry_run=dry_run)
     print(str(version), file=sys.stdout)
 
 
@@ -75,15 +105,221 @@ def info(
         Type of version format
 
     """
+    controller = _get_controller()
     if release:
-        print(_controller.release, file=sys.stdout)
+        print(controller.release, file=sys.stdout)
     if filepaths:
-        for x in _controller.config.templates:
+        for x in controller.config.templates:
             print(x['filepath'], file=sys.stdout)
     if compat:
         ...
     if not release and not filepaths:
-        print(_controller.config.version, file=sys.stdout)
+        print(controller.config.version, file=sys.stdout)
+
+
+def _dump_commit(oid: str, commit: ParsedCommit) -> str:
+    """Format parsed commit as a JSON line."""
+    return json.dumps(
+        {
+            'oid': oid,
+            'type': commit.type,
+            'scope': commit.scope,
+            'breaking': commit.is_breaking,
+            'status': commit.status,
+            'issues': [{k: v} for k, v in commit.issues],
+        }
+    )
+
+
+def parse(
+    stdin: bool = False,
+    workers: Optional[int] = None,
+    chunksize: Optional[int] = None,
+    tolerant: bool = False,
+) -> None:
+    """Classify commit messages as JSON lines.
+
+    Parameters
+    ----------
+    stdin: bool
+        Read NUL-delimited commit ids and messages from stdin instead of
+        the current commit.
+    workers: int
+        Number of processes used to parse commit messages.
+    chunksize: int
+        Number of commit messages sent to a process at a time.
+    tolerant: bool
+        Classify nonconforming messages as misc and print statistics to
+        stderr instead of stopping at the first error.
+
+    """
+    if not stdin:
+        controller = _get_controller()
+        head = controller.vcs.repo.head.target
+        print(_dump_commit(str(head), controller.commit), file=sys.stdout)
+        return
+
+    options = get_parser_config().options
+    records = iter_log_records(sys.stdin.buffer)
+    if options['profile'] == 'auto':
+        # NOTE: detect the convention from the first messages read
+        sample = list(islice(records, 50))
+        options['profile'] = detect_profile(x for _, x in sample)
+        records = chain(sample, records)
+    parser = CommitMessageParser(**options)
+    oids: Deque[str] = deque()
+
+    # NOTE: argufy passes optional integers as strings
+    workers = int(workers or 1)
+    chunksize = int(chunksize or 256)
+
+    def messages() -> Iterator[str]:
+        for oid, message in records:
+            oids.append(oid)
+            yield message
+
+    stats = ParseStats() if tolerant else None
+    for commit in parser.parse_many(
+        messages(),
+        workers=workers,
+        chunksize=chunksize,
+        tolerant=tolerant,
+        stats=stats,
+    ):
+        sys.stdout.write(_dump_commit(oids.popleft(), commit) + '\n')
+    if stats is not None:
+        print(json.dumps(stats.as_dict()), file=sys.stderr)
+
+
+def changelog(
+    output_format: str = 'markdown',
+    filepath: Optional[str] = None,
+    since: Optional[str] = None,
+    workers: Optional[int] = None,
+    incremental: bool = False,
+    profile_memory: bool = False,
+    profile_format: str = 'table',
+) -> None:
+    """Generate changelog from release tags.
+
+    Parameters
+    ----------
+    output_format: str
+        Format of the changelog: markdown, json or ndjson.
+    filepath: str
+        Path of the changelog or `-` to write it to stdout.
+    since: str
+        Only categorize commits after this revision.
+    workers: int
+        Number of processes used to parse commit messages.
+    incremental: bool
+        Only add releases newer than those in the existing changelog.
+    profile_memory: bool
+        Report memory allocated by each phase to stderr.
+    profile_format: str
+        Format of the memory report: table or json.
+
+    """
+    # NOTE: mdutils is provided by the optional changelog extra
+    from versioning.changelog import (  # pylint: disable=C0415
+        Changelog,
+    )
+
+    controller = _get_controller()
+    profiler = MemoryProfiler() if profile_memory else None
+    if profiler:
+        profiler.start()
+    try:
+        with get_commit_cache(
+            controller.vcs.repo_dir,
+            grammar_path=controller.profile.grammar_path,
+            parser=controller.config.parser.parser,
+        ) as commit_cache:
+            document = Changelog(
+                controller.vcs.repo,
+                cache=commit_cache,
+                parser=CommitMessageParser(**controller.config.parser.options),
+                # NOTE: argufy passes optional integers as strings
+                workers=int(workers or 1),
+                renderer=output_format,
+                profiler=profiler,
+            )
+            if filepath == '-':
+                document.write_changelog(sys.stdout, since=since)
+            elif incremental and since is None:
+                document.update_changelog(filepath=filepath)
+            else:
+                document.generate_changelog(since=since, filepath=filepath)
+    finally:
+        # NOTE: phases profiled before a failure are still reported
+        if profiler:
+            profiler.stop()
+            sys.stderr.write(
+                profiler.as_json() + '\n'
+                if profile_format == 'json'
+                else profiler.as_table()
+            )
+
+
+def issues(
+    release: Optional[str] = None,
+    issue: Optional[str] = None,
+    unreleased: bool = False,
+    workers: Optional[int] = None,
+) -> None:
+    """List issues and trailers referenced by commits.
+
+    Parameters
+    ----------
+    release: str
+        List references of commits first shipped in this release.
+    issue: str
+        List commits and releases referencing an issue key or trailer,
+        matched by its token, email or value, or by `token:value`.
+    unreleased: bool
+        List references of commits that are not released yet.
+    workers: int
+        Number of processes used to parse commit messages.
+
+    """
+    controller = _get_controller()
+    options = controller.config.parser.options
+    with get_issue_index(
+        controller.vcs.repo_dir,
+        grammar_path=controller.profile.grammar_path,
+        parser=options['parser'],
+    ) as index:
+        index.update(
+            controller.vcs.repo,
+            parser=CommitMessageParser(**options),
+            # NOTE: argufy passes optional integers as strings
+            workers=int(workers or 1),
+        )
+        if issue is not None:
+            references = index.find(issue)
+        elif release is not None or unreleased:
+            references = index.get_release(release)
+        else:
+            raise VersioningException('either release or issue is required')
+        for reference in references:
+            sys.stdout.write(json.dumps(asdict(reference)) + '\n')
+
+
+def contains(revision: str) -> None:
+    """Get the first release containing a commit.
+
+    Parameters
+    ----------
+    revision: str
+        Commit id or revision of the commit.
+
+    """
+    controller = _get_controller()
+    with get_release_index(controller.vcs.repo_dir) as index:
+        release = index.first_release(controller.vcs.repo, revision)
+    if release is None:
+        raise VersioningException(f"commit is not released: {revision}")
+    print(release, file=sys.stdout)
 
 
 def push(
@@ -113,7 +349,7 @@ def push(
 
     """
     # INFO: Helper for when run from containers without git.
-    _controller.push_changes(
+    _get_controller().push_changes(
         branch=branch,
         remote=remote,
         remote_branch=remote_branch,
@@ -121,3 +357,27 @@ def push(
         username=username,
         password=password,
     )
+
+
+def cache(action: str) -> None:
+    """Manage cache of parsed commit messages.
+
+    Parameters
+    ----------
+    action: str
+        Use `clear` to remove cached commits or `stats` to view statistics.
+
+    """
+    controller = _get_controller()
+    with get_commit_cache(
+        controller.vcs.repo_dir,
+        grammar_path=controller.profile.grammar_path,
+        parser=controller.config.parser.parser,
+    ) as commit_cache:
+        if action == 'clear':
+            commit_cache.clear()
+        elif action == 'stats':
+            for key, value in commit_cache.stats().items():
+                print(f"{key}: {value}", file=sys.stdout)
+        else:
+            raise VersioningException(f"unknown cache action: {action}")
@@ -4,12 +4,13 @@
 
 import os
 from dataclasses import InitVar, asdict, dataclass, field
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional, Tuple
 
 from compendium.config_manager import ConfigManager
 from pygit2 import discover_repository
 
 from versioning.exception import VersioningException
+from versioning.rewriter import Rewriter
 from versioning.version import Version
 
 # from urllib.parse import urljoin, urlparse
@@ -21,9 +22,12 @@ REPO_DIR = (
     if os.path.exists(f"{CURRENT_DIR}/.git")
     else discover_repository(CURRENT_DIR)
 )
-if REPO_DIR is None:
-    raise VersioningException('Unable to locate git repository.')
-PROJECT_DIR = os.path.abspath(os.path.join(REPO_DIR, os.pardir))
+# NOTE: commands that only parse messages do not need a repository
+PROJECT_DIR = (
+    os.path.abspath(os.path.join(REPO_DIR, os.pardir))
+    if REPO_DIR is not None
+    else CURRENT_DIR
+)
 CONFIG_FILES = [
     os.path.join(PROJECT_DIR, '.version'),
     os.path.join(PROJECT_DIR, '.versioning'),
@@ -34,8 +38,27 @@ CONFIG_FILES = [
 GRAMMAR_PATH: str = os.path.join(
     os.path.dirname(__file__), 'grammars', 'conventional_commits.lark'
 )
+LALR_GRAMMAR_PATH: str = os.path.join(
+    os.path.dirname(__file__), 'grammars', 'conventional_commits_lalr.lark'
+)
+ANGULAR_GRAMMAR_PATH: str = os.path.join(
+    os.path.dirname(__file__), 'grammars', 'angular.lark'
+)
+GITMOJI_GRAMMAR_PATH: str = os.path.join(
+    os.path.dirname(__file__), 'grammars', 'gitmoji.lark'
+)
+TICKET_GRAMMAR_PATH: str = os.path.join(
+    os.path.dirname(__file__), 'grammars', 'ticket.lark'
+)
 # 'versioning/templates/gitmessage.j2'
 
+CACHE_DIR: str = os.path.join(
+    os.environ.get(
+        'XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache')
+    ),
+    'proman-versioning',
+)
+
 COMMIT_TYPES = [
     'build',
     'chore',
@@ -65,9 +88,26 @@ class ParserConfig:
     config: InitVar[Dict[str, Any]] = None
     types: List[str] = field(default_factory=list)
     scopes: List[str] = field(default_factory=list)
+    parser: str = 'earley'
+    profile: str = 'conventional'
+    max_title_length: Optional[int] = None
+    max_body_size: Optional[int] = None
+    timeout: Optional[float] = None
 
     def __post_init__(self, config: Dict[str, Any]) -> None:
         """Configure VCS message parsing."""
+        if config is not None:
+            for key in (
+                'parser',
+                'profile',
+                'max_title_length',
+                'max_body_size',
+            ):
+                if key in config:
+                    setattr(self, key, config[key])
+            if 'parse_timeout' in config:
+                self.timeout = config['parse_timeout']
+
         # thinking builtin types might not need to be here
         # if (
         #     self.types == []
@@ -100,6 +140,17 @@ class ParserConfig:
         ):
             self.scopes = config['scopes']
 
+    @property
+    def options(self) -> Dict[str, Any]:
+        """Get options for commit message parsers."""
+        return {
+            'parser': self.parser,
+            'profile': self.profile,
+            'max_title_length': self.max_title_length,
+            'max_body_size': self.max_body_size,
+            'timeout': self.timeout,
+        }
+
 
 @dataclass
 class ReleaseConfig:
@@ -140,6 +191,16 @@ class ReleaseConfig:
 #     pattern: str
 
 
+def get_parser_config(filepaths: List[str] = CONFIG_FILES) -> ParserConfig:
+    """Get parser settings without loading the project version."""
+    config = ConfigManager(filepaths=filepaths, separator='.')
+    settings = dict(
+        config.lookup('versioning', 'tool.proman.versioning') or {}
+    )
+    settings.setdefault('types', COMMIT_TYPES)
+    return ParserConfig(config=settings)
+
+
 @dataclass
 class Config(ConfigManager):
     """Manage settings from configuration file."""
@@ -147,9 +208,14 @@ class Config(ConfigManager):
     filepaths: InitVar[List[str]]
     defaults: InitVar[Dict[str, Any]] = field(default={})
     templates: List[Dict[str, Any]] = field(default_factory=list)
+    clean_check: str = field(default='repository', init=False)
+    workers: Optional[int] = field(default=None, init=False)
     parser: ParserConfig = field(init=False)
     release: ReleaseConfig = field(init=False)
     version: Version = field(init=False)
+    rewriters: Dict[Tuple[Tuple[str, ...], str], Rewriter] = field(
+        default_factory=dict, init=False, repr=False
+    )
 
     def __post_init__(
         self, filepaths: List[str], defaults: Dict[str, Any]
@@ -174,6 +240,18 @@ class Config(ConfigManager):
         ]
         # os.path.relpath(CONFIG_FILES[0], start=PROJECT_DIR),
 
+        # NOTE: either the whole repository or only the template files
+        if 'clean_check' in config:
+            if config['clean_check'] not in ('repository', 'templates'):
+                raise VersioningException(
+                    f"unknown clean check: {config['clean_check']}"
+                )
+            self.clean_check = config['clean_check']
+
+        # NOTE: threads used to rewrite version files
+        if 'workers' in config:
+            self.workers = config['workers']
+
         if 'types' not in config:
             config['types'] = COMMIT_TYPES
         self.parser = ParserConfig(config=config)
@@ -192,3 +270,15 @@ class Config(ConfigManager):
             version=str(config_version),
             **asdict(ReleaseConfig(config=config)),
         )
+
+    def get_rewriter(self, template: Dict[str, Any], query: str) -> Rewriter:
+        """Get compiled patterns of a version file for a version query."""
+        patterns = (
+            template['patterns']
+            if 'patterns' in template
+            else [template['pattern']]
+        )
+        key = (tuple(patterns), query)
+        if key not in self.rewriters:
+            self.rewriters[key] = Rewriter(patterns, query)
+        return self.rewriters[key]
@@ -5,25 +5,31 @@
 import difflib
 import logging
 import os
-import re
+import sqlite3
 import sys
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 from copy import deepcopy
-from string import Template
-from typing import TYPE_CHECKING, Any, Dict, Iterator
+from itertools import islice
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
 
 # from transitions import Machine
+from versioning.cache import get_cache_path, get_commit_cache
 from versioning.exception import VersioningException
 from versioning.grammars.conventional_commits import CommitMessageParser
+from versioning.grammars.registry import DEFAULT_PROFILE, detect_profile
+from versioning.rewriter import (
+    STREAM_SIZE,
+    Rewriter,
+    RewriteState,
+    RewriteTransaction,
+    rewrite_lines,
+    scan_file,
+)
 from versioning.version import Version
 
-if 'mdutils' not in sys.modules:
-    enable_changelog = False
-else:
-    from versioning.changelog import Changelog
-
-    enable_changelog = True
-
 if TYPE_CHECKING:
+    from versioning.changelog import Changelog
     from versioning.config import Config
     from versioning.vcs import Git
 
@@ -64,108 +70,237 @@ class ReleaseController(CommitMessageParser):
         self.config = config
         # parse_current_branch = kwargs.pop('parse_current_branch', True)
         message = kwargs.pop('message', None)
+        if self.config.parser.profile == 'auto':
+            # NOTE: sample recent history once so messages skip detection
+            self.config.parser.profile = self._detect_profile(repo)
+        for key, value in self.config.parser.options.items():
+            kwargs.setdefault(key, value)
         super().__init__(*args, **kwargs)
 
         self.vcs = repo
-        self.changelog = Changelog(self.vcs.repo) if enable_changelog else None
+        self.__changelog: Optional['Changelog'] = None
 
         if message is None:
             head = self.vcs.repo.head
             target = self.vcs.repo[head.target]
-            self.parse(target.message)
+            self.parse(target.message, header_only=True)
             log.debug('provided commit message: %r', message)
         else:
-            self.parse(message)
+            self.parse(message, header_only=True)
             log.debug('found commit message: %r', message)
 
+    @staticmethod
+    def _detect_profile(repo: 'Git') -> str:
+        """Detect commit message profile once for each HEAD."""
+        if repo.repo.head_is_unborn:
+            # NOTE: there is no history to sample before the first commit
+            return DEFAULT_PROFILE
+        head = str(repo.repo.head.target)
+
+        def sample() -> str:
+            return detect_profile(
+                x.message for x in islice(repo.repo.walk(head), 50)
+            )
+
+        try:
+            with get_commit_cache(repo.repo_dir) as cache:
+                state = (cache.get_state('profile') or '').split(' ')
+                if len(state) == 2 and state[0] == head:
+                    return state[1]
+                profile = sample()
+                cache.set_state('profile', f"{head} {profile}")
+                return profile
+        except (OSError, sqlite3.Error) as err:
+            log.debug('unable to cache commit message profile: %s', err)
+            return sample()
+
+    @property
+    def changelog(self) -> Optional['Changelog']:
+        """Get changelog when the changelog extra is installed."""
+        if self.__changelog is None:
+            try:
+                from versioning.changelog import (  # pylint: disable=C0415
+                    Changelog,
+                )
+            except ImportError:
+                log.debug('changelog requires mdutils to be installed')
+                return None
+
+            self.__changelog = Changelog(
+                self.vcs.repo,
+                cache=get_commit_cache(
+                    self.vcs.repo_dir,
+                    grammar_path=self.profile.grammar_path,
+                    parser=self.config.parser.parser,
+                ),
+                # NOTE: the controller keeps state of the current commit
+                parser=CommitMessageParser(**self.config.parser.options),
+            )
+        return self.__changelog
+
     @property
     def release(self) -> str:
         """Get the current version release state."""
         return self.config.version.state  # type: ignore
 
-    def __update_config(
+    def __update_file(
         self,
-        config: Dict[str, Any],
+        filepath: str,
+        configs: List[Dict[str, Any]],
         new_version: Version,
+        transaction: RewriteTransaction,
+        state: RewriteState,
+        skipped: Dict[str, Optional[Tuple[os.stat_result, str]]],
         dry_run: bool = False,
-    ) -> Iterator[str]:
-        """Update target file with new version."""
-        version = deepcopy(self.config.version)
+    ) -> List[str]:
+        """Update target file with new version and get its diff."""
+        path = os.path.join(self.vcs.working_dir, filepath)
+        needle = '.'.join(str(x) for x in self.config.version.release)
+        try:
+            info: Optional[os.stat_result] = os.stat(path)
+        except OSError:
+            info = None
+
+        # NOTE: skip regex and diff when the version cannot match
+        if info is not None:
+            if state.is_unchanged(path, needle, info):
+                skipped[path] = None
+                log.info(
+                    'skipping unchanged file without %s: %r', needle, path
+                )
+                return []
+            contains, digest = scan_file(path, needle.encode('utf-8'))
+            if not contains and digest is not None:
+                log.warning('skipping file without %s: %r', needle, path)
+                skipped[path] = (info, digest)
+                return []
 
-        # handle compatiblity with semver
-        if 'compat' in config:
-            version.compat = config['compat']
-            new_version.compat = config['compat']
+        rewrites: List[Tuple[Rewriter, str]] = []
+        for config in configs:
+            version = deepcopy(self.config.version)
+            target = deepcopy(new_version)
 
-        filepath = os.path.join(self.vcs.working_dir, config['filepath'])
+            # handle compatiblity with semver
+            if 'compat' in config:
+                version.compat = config['compat']
+                target.compat = config['compat']
+            rewrites.append(
+                (self.config.get_rewriter(config, version.query), str(target))
+            )
 
         # TODO: handle when file does not exist
-        with open(filepath, 'r+', encoding='utf-8') as file:
-            file_contents = file.read()
-
-            for pattern in (
-                config['patterns']
-                if 'patterns' in config
-                else [config['pattern']]
-            ):
-                template = Template(pattern).substitute(version=version.query)
-                match = re.compile(
-                    # XXX: escape not compiling correctly
-                    template,  # re.escape(template),
-                    flags=0,
+        if info is not None and info.st_size >= STREAM_SIZE:
+            # NOTE: large files are rewritten and diffed one line at a time
+            with open(path, encoding='utf-8', newline='') as source, (
+                transaction.open(path) if not dry_run else nullcontext()
+            ) as file:
+                counts, deltas = rewrite_lines(
+                    source, file, rewrites, fromfile=path
                 )
-                log.debug('applying pattern for source version %s', match)
+        else:
+            with open(path, encoding='utf-8', newline='') as source:
+                file_contents = source.read()
 
-                # substitute the expression in file
-                file_update = match.sub(
-                    Template(pattern).substitute(version=str(new_version)),
-                    file_contents,
+            # substitute the expressions of all patterns in a single scan
+            file_update = file_contents
+            counts = []
+            for rewriter, target_version in rewrites:
+                file_update, found = rewriter.sub(file_update, target_version)
+                counts.append(found)
+            deltas = list(
+                difflib.unified_diff(
+                    file_contents.splitlines(),
+                    file_update.splitlines(),
+                    fromfile=path,
                 )
-
-            deltas = difflib.unified_diff(
-                file_contents.splitlines(),
-                file_update.splitlines(),
-                fromfile=filepath,
             )
-
             if not dry_run:
-                # check version file update is applied
-                if not list(deltas):
-                    raise VersioningException(
-                        f"version update was not applied to {filepath}"
-                    )
-                # save the file
-                try:
-                    file.seek(0)
-                    file.truncate()
-                    file.write(file_update)
-                    log.info('writting file at: %r', filepath)
-                except OSError as err:
-                    print(err, file=sys.stderr)
-            else:
+                transaction.stage(path, file_update)
+
+        for (rewriter, _), found in zip(rewrites, counts):
+            for template, count in zip(rewriter.templates, found):
                 log.info(
-                    'view version update instead of file write at: %r',
-                    filepath,
+                    'pattern %r matched %d times in %r',
+                    template.template,
+                    count,
+                    path,
+                )
+
+            # check version file update is applied
+            if not dry_run and not any(found):
+                raise VersioningException(
+                    f"version update was not applied to {path}"
+                )
+
+        if dry_run:
+            log.info('view version update instead of file write at: %r', path)
+        return deltas
+
+    def __update_files(self, new_version: Version, dry_run: bool) -> None:
+        """Update version files concurrently as a single transaction.
+
+        Templates of the same file are applied in order by the same task
+        and files are only replaced once every file is rewritten.
+        """
+        files: Dict[str, List[Dict[str, Any]]] = {}
+        for config in self.config.templates:
+            files.setdefault(config['filepath'], []).append(config)
+        state = RewriteState(
+            get_cache_path(self.vcs.repo_dir, 'rewrites.json')
+        )
+        skipped: Dict[str, Optional[Tuple[os.stat_result, str]]] = {}
+
+        with RewriteTransaction() as transaction, ThreadPoolExecutor(
+            max_workers=self.config.workers
+        ) as executor:
+            results = list(
+                executor.map(
+                    lambda x: self.__update_file(
+                        filepath=x[0],
+                        configs=x[1],
+                        new_version=new_version,
+                        transaction=transaction,
+                        state=state,
+                        skipped=skipped,
+                        dry_run=dry_run,
+                    ),
+                    files.items(),
                 )
-                # diff the file changes
+            )
+
+        if not dry_run:
+            needle = '.'.join(str(x) for x in self.config.version.release)
+            for filepath in files:
+                path = os.path.join(self.vcs.working_dir, filepath)
+                record = skipped.get(path)
+                if record is not None:
+                    state.set(path, needle, *record)
+                elif path not in skipped:
+                    state.discard(path)
+            try:
+                state.save()
+            except OSError as err:
+                log.debug('unable to save rewrite state: %s', err)
+
+        if dry_run:
+            # diff the file changes
+            for deltas in results:
                 for x in deltas:
                     print(x, file=sys.stdout)
-            return deltas
 
     def _update_configs(self, new_version: Version, **kwargs: Any) -> None:
         """Update version within config files."""
         dry_run = kwargs.pop('dry_run', False)
-        if self.vcs.repo.diff('HEAD').stats.files_changed == 0 or dry_run:
+        if dry_run or self.vcs.is_clean(
+            [x['filepath'] for x in self.config.templates]
+            if self.config.clean_check == 'templates'
+            else None
+        ):
             if self.config.version != new_version:
                 # TODO: create tarfile here
-                for config in self.config.templates:
-                    # NOTE: need conditional here to switch update or patch
-                    self.__update_config(
-                        config=config,
-                        new_version=new_version,
-                        dry_run=dry_run,
-                    )
-                    # TODO: add diffs to tarfile
+                # NOTE: need conditional here to switch update or patch
+                self.__update_files(new_version, dry_run=dry_run)
+                # TODO: add diffs to tarfile
 
                 self.config.version = new_version
                 make_commit = kwargs.pop('commit', True)
@@ -200,11 +335,8 @@ class ReleaseController(CommitMessageParser):
     def update_version(self, **kwargs: Any) -> Version:
         """Update the version of the project."""
         new_version = deepcopy(self.config.version)
-        if self.changelog:
-            self.changelog.generate_changelog()
-        if (
-            'type' in self.title and self.title['type'] == 'release'
-        ) or kwargs.get('release') is True:
+        commit = self.commit
+        if commit.type == 'release' or kwargs.get('release') is True:
             new_version.start_release(segment='minor')  # type: ignore
         else:
             build = kwargs.pop('build', None)
@@ -212,14 +344,14 @@ class ReleaseController(CommitMessageParser):
             # TODO: break and feat should start devrelease from final or post
             # local number depends on metadata / fork / conflict existing
             # versions
-            if self.title['break'] or self.footer['breaking_change']:
+            if commit.is_breaking:
                 new_version.bump_major()  # type: ignore
-            elif 'type' in self.title:
-                if self.title['type'] == 'feat':
+            elif commit.type is not None:
+                if commit.type == 'feat':
                     new_version.bump_minor()  # type: ignore
-                elif self.title['type'] == 'fix':
+                elif commit.type == 'fix':
                     new_version.bump_micro()  # type: ignore
-                elif self.title['type'] in self.config.parser.types:
+                elif commit.type in self.config.parser.types:
                     # XXX: should bump post instead
                     # XXX: release should span multiple changes
                     # new_version = self.__bump_release(new_version)
@@ -236,6 +368,15 @@ class ReleaseController(CommitMessageParser):
         self._update_configs(new_version, **kwargs)
         return new_version
 
+    def update_changelog(self, dry_run: bool = False) -> bool:
+        """Update changelog with releases tagged since its last update."""
+        if dry_run:
+            log.info('skipping changelog update for dry run')
+            return False
+        if self.changelog is None:
+            raise VersioningException('changelog requires mdutils')
+        return self.changelog.update_changelog()
+
     def push_changes(self, **kwargs: Any) -> None:
         """Push changes to repository."""
         branch = kwargs.pop('branch')
@@ -5,3 +5,7 @@
 
 class VersioningException(Exception):
     """Provide base errors in PackageManager."""
+
+
+class ParseTimeoutError(VersioningException):
+    """Provide error when parsing exceeds its time budget."""
@@ -0,0 +1,50 @@
+# copyright: (c) 2021 by Jesse Johnson.
+# license: LGPL-3.0, see LICENSE.md for more details.
+"""Write files through temporary files."""
+
+import os
+import stat
+import tempfile
+from contextlib import contextmanager
+from typing import IO, Any, Iterator
+
+
+@contextmanager
+def stage_file(
+    filepath: str, mode: str = 'w', **kwargs: Any
+) -> Iterator[IO[Any]]:
+    """Write a temporary file next to a file without replacing it.
+
+    The path of the temporary file is its `name`. It takes the permissions
+    of the staged file when that exists and is removed when writing fails.
+    """
+    dirname = os.path.dirname(os.path.abspath(filepath))
+    os.makedirs(dirname, exist_ok=True)
+    file: IO[Any] = tempfile.NamedTemporaryFile(
+        mode, dir=dirname, suffix='.tmp', delete=False, **kwargs
+    )
+    try:
+        with file:
+            yield file
+        try:
+            permissions = stat.S_IMODE(os.stat(filepath).st_mode)
+        except FileNotFoundError:
+            permissions = 0o644
+        os.chmod(file.name, permissions)
+    except BaseException:
+        os.remove(file.name)
+        raise
+
+
+@contextmanager
+def atomic_write(
+    filepath: str, mode: str = 'w', **kwargs: Any
+) -> Iterator[IO[Any]]:
+    """Write file through a temporary file that replaces it when done."""
+    with stage_file(filepath, mode, **kwargs) as file:
+        yield file
+    try:
+        os.replace(file.name, filepath)
+    except BaseException:
+        os.remove(file.name)
+        raise
@@ -2,108 +2,654 @@
 # license: LGPL-3.0, see LICENSE.md for more details.
 """Parse Git commit messages."""
 
-# import logging
-from collections import defaultdict
-from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional
+import logging
+import re
+import signal
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, replace
+from itertools import islice
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
 
-from lark import Lark
+from lark import Token
+from lark.exceptions import LarkError, UnexpectedInput
 
-from versioning.config import GRAMMAR_PATH
+from versioning.config import CACHE_DIR
+from versioning.exception import ParseTimeoutError
+from versioning.grammars.registry import get_parser, get_profile
 
 if TYPE_CHECKING:
-    from lark import UnexpectedInput
+    from lark import Lark
     from lark.tree import Tree
 
+HEADER_REGEX = re.compile(
+    r':?(?P<type>[A-Za-z_][A-Za-z0-9_]*):?'
+    r'(?:\((?P<scope>[A-Za-z_][A-Za-z0-9_]*)\))?'
+    r'(?P<break>!)?: (?P<description>\S[^\r\n]*)'
+)
+HEADER_PREFIX_REGEX = re.compile(r':?\s*[A-Za-z_][A-Za-z0-9_]*\s*[:(!]')
+BREAKING_CHANGE_REGEX = re.compile(
+    r'^BREAKING[ -]?CHANGE: *(?P<description>[^\r\n]*)', re.MULTILINE
+)
+FOOTER_REGEX = re.compile(
+    r'BREAKING[ -]?CHANGE: |[A-Za-z][A-Za-z-]*[A-Za-z](?:: | #)'
+)
+# NOTE: commits classified by the header fast path depend on these patterns
+HEADER_PATTERNS = tuple(
+    x.pattern
+    for x in (HEADER_REGEX, HEADER_PREFIX_REGEX, BREAKING_CHANGE_REGEX)
+)
+ISSUE_REGEX = re.compile(
+    r'(?P<token>[A-Za-z][A-Za-z-]*[A-Za-z]) '
+    r'#(?P<value>(?:[A-Za-z_][A-Za-z0-9_]*-)?\d+)'
+)
+TRAILER_REGEX = re.compile(
+    r"(?P<token>[A-Za-z][A-Za-z-]*[A-Za-z]): "
+    r"(?P<name>[A-Za-z ,.'-]+)<(?P<email>[^<>\s@]+@[^<>\s]+)>"
+)
+# NOTE: references of recovered commits depend on these patterns
+FOOTER_PATTERNS = tuple(x.pattern for x in (ISSUE_REGEX, TRAILER_REGEX))
+
+# NOTE: issues and trailers matched from a footer
+Footer = Tuple[Tuple[Tuple[str, str], ...], Tuple[Tuple[str, str, str], ...]]
+
+log = logging.getLogger(__name__)
+
+_worker_parser: Optional['CommitMessageParser'] = None
+
+
+@dataclass(frozen=True)
+class ParsedCommit:
+    """Provide immutable result of a parsed commit message."""
+
+    __slots__ = (
+        'type',
+        'scope',
+        'breaking',
+        'description',
+        'body',
+        'issues',
+        'trailers',
+        'breaking_change',
+        'degraded',
+    )
+
+    type: Optional[str]
+    scope: Optional[str]
+    breaking: bool
+    description: Optional[str]
+    body: Tuple[str, ...]
+    issues: Tuple[Tuple[str, str], ...]
+    trailers: Tuple[Tuple[str, str, str], ...]
+    breaking_change: Optional[str]
+    degraded: bool
+
+    def __getstate__(self) -> Tuple[Any, ...]:
+        """Get state of commit for pickling."""
+        return tuple(getattr(self, x) for x in self.__slots__)
+
+    def __setstate__(self, state: Tuple[Any, ...]) -> None:
+        """Set state of commit from pickling."""
+        for name, value in zip(self.__slots__, state):
+            object.__setattr__(self, name, value)
+
+    @property
+    def status(self) -> str:
+        """Get whether commit is conforming, recovered or unparseable.
+
+        Messages without a type conform when the grammar accepts them, so
+        only degraded commits are recovered or unparseable.
+        """
+        if not self.degraded:
+            return 'conforming'
+        return 'unparseable' if self.type is None else 'recovered'
+
+    @property
+    def is_breaking(self) -> bool:
+        """Check if commit introduces a breaking change."""
+        return self.breaking or self.breaking_change is not None
+
+    @classmethod
+    def from_tree(cls, tree: 'Tree', degraded: bool = False) -> 'ParsedCommit':
+        """Create commit from parse tree in a single pass."""
+        title: Dict[str, Any] = {}
+        body: List[str] = []
+        issues: List[Tuple[str, str]] = []
+        trailers: List[Tuple[str, str, str]] = []
+        breaking_change = None
+
+        sections: List[Any] = tree.children
+        for section in sections:
+            if isinstance(section, Token):
+                # NOTE: body with a single line is inlined by the grammar
+                body.append(section.value.strip())
+                continue
+            if section.data == 'title':
+                for arg in section.children:
+                    title[arg.data] = next(
+                        (x.value.strip() for x in arg.children), True
+                    )
+                if 'ticket' in title:
+                    issues.append(('Refs', title['ticket']))
+                continue
+            if section.data == 'body':
+                body.extend(x.value.strip() for x in section.children)
+                continue
+
+            # NOTE: footer with a single item is inlined by the grammar
+            for arg in (
+                section.children if section.data == 'footer' else [section]
+            ):
+                if arg.data == 'breaking_change':
+                    breaking_change = next(
+                        (x.value.strip() for x in arg.children), 'Unknown'
+                    )
+                elif arg.data == 'issue':
+                    # Refs
+                    # Fix
+                    issues.append(
+                        (
+                            arg.children[0].value,
+                            '-'.join(
+                                x.value.strip() for x in arg.children[1:]
+                            ),
+                        )
+                    )
+                elif arg.data == 'trailer':
+                    # Acked-by
+                    # Cc
+                    # Helped-by
+                    # Reviewed-by
+                    # Reported-by
+                    # Signed-off-by
+                    # Tested-by
+                    token, name, email = (
+                        x.value.strip() for x in arg.children
+                    )
+                    trailers.append((token, name, email))
+
+        return cls(
+            type=title.get('type'),
+            scope=title.get('scope'),
+            breaking=title.get('break', False),
+            description=title.get('description'),
+            body=tuple(body),
+            issues=tuple(issues),
+            trailers=tuple(trailers),
+            breaking_change=breaking_change,
+            degraded=degraded,
+        )
+
+
+def match_header(text: str) -> Optional[ParsedCommit]:
+    """Classify commit message header without the grammar.
+
+    Returns `None` when the full grammar is needed to classify the message.
+    """
+    line = text.lstrip().partition('\n')[0].strip()
+    if not line:
+        return None
+
+    match = HEADER_REGEX.fullmatch(line)
+    if match is None and HEADER_PREFIX_REGEX.match(line):
+        # NOTE: might still be a header the grammar accepts
+        return None
+
+    return ParsedCommit(
+        type=match['type'] if match else None,
+        scope=match['scope'] if match else None,
+        breaking=bool(match and match['break']),
+        description=match['description'].strip() if match else line,
+        body=(),
+        issues=(),
+        trailers=(),
+        breaking_change=_match_breaking_change(text),
+        degraded=False,
+    )
+
+
+def _match_breaking_change(text: str) -> Optional[str]:
+    """Get breaking change footer of a message without the grammar."""
+    match = BREAKING_CHANGE_REGEX.search(text)
+    if match is None:
+        return None
+    return match['description'].strip() or 'Unknown'
+
+
+def match_footer(text: str) -> Footer:
+    """Get issues and trailers of a message without the grammar.
+
+    Only the lines of the last paragraph after the title are matched.
+    """
+    issues: List[Tuple[str, str]] = []
+    trailers: List[Tuple[str, str, str]] = []
+    _, _, body = text.strip().partition('\n')
+    for line in body.rstrip().split('\n\n')[-1].splitlines():
+        line = line.strip()
+        issue = ISSUE_REGEX.fullmatch(line)
+        if issue is not None:
+            issues.append((issue['token'], issue['value']))
+            continue
+        trailer = TRAILER_REGEX.fullmatch(line)
+        if trailer is not None:
+            trailers.append(
+                (trailer['token'], trailer['name'].strip(), trailer['email'])
+            )
+    return tuple(issues), tuple(trailers)
+
+
+def _misc_commit(text: str) -> ParsedCommit:
+    """Get unclassified commit from the first line of a message."""
+    issues, trailers = match_footer(text)
+    return ParsedCommit(
+        type=None,
+        scope=None,
+        breaking=False,
+        description=text.lstrip().partition('\n')[0].strip(),
+        body=(),
+        issues=issues,
+        trailers=trailers,
+        breaking_change=_match_breaking_change(text),
+        degraded=False,
+    )
+
+
+@dataclass
+class ParseStats:
+    """Summarize outcome of parsing many commit messages."""
+
+    conforming: int = 0
+    recovered: int = 0
+    unparseable: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def total(self) -> int:
+        """Get number of commit messages parsed."""
+        return self.conforming + self.recovered + self.unparseable
+
+    def add(self, commit: ParsedCommit, elapsed: float = 0.0) -> None:
+        """Count outcome of a parsed commit."""
+        status = commit.status
+        setattr(self, status, getattr(self, status) + 1)
+        self.elapsed += elapsed
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Get statistics as a dictionary."""
+        return {
+            'total': self.total,
+            'conforming': self.conforming,
+            'recovered': self.recovered,
+            'unparseable': self.unparseable,
+            'elapsed': round(self.elapsed, 6),
+        }
+
+
+@contextmanager
+def time_limit(seconds: Optional[float]) -> Iterator[None]:
+    """Raise `ParseTimeoutError` when the block exceeds its time budget.
+
+    The budget relies on `SIGALRM` and is only enforced within the main
+    thread on platforms that provide interval timers.
+    """
+    if (
+        not seconds
+        or not hasattr(signal, 'setitimer')
+        or threading.current_thread() is not threading.main_thread()
+    ):
+        yield
+        return
+
+    def handler(signum: int, frame: Any) -> None:
+        raise ParseTimeoutError(f"parsing exceeded {seconds} seconds")
+
+    previous = signal.signal(signal.SIGALRM, handler)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def _init_worker(options: Dict[str, Any]) -> None:
+    """Build parser once for each worker process."""
+    global _worker_parser  # pylint: disable=global-statement
+    _worker_parser = CommitMessageParser(**options)
+
+
+def _parse_chunk(
+    messages: List[Union[str, ParsedCommit]],
+    header_only: bool = False,
+    tolerant: bool = False,
+) -> List[ParsedCommit]:
+    """Parse chunk of commit messages within a worker process."""
+    assert _worker_parser is not None  # nosec
+    return [
+        (
+            x
+            if isinstance(x, ParsedCommit)
+            else _worker_parser._parse_record(x, header_only, tolerant)
+        )
+        for x in messages
+    ]
+
 
 class CommitMessageParser:
     """Parse commit messages."""
 
-    __tree: 'Tree'
+    __commit: Optional[ParsedCommit] = None
 
     def __init__(
         self,
-        grammar_path: str = GRAMMAR_PATH,
+        grammar_path: Optional[str] = None,
         start: str = 'message',
-        **kwargs: Any
+        **kwargs: Any,
     ) -> None:
-        """Initialize commit message parser."""
-        # TODO: need to limit messages to 100 characters
+        """Initialize commit message parser.
+
+        The `profile` selects the commit message convention parsed. Using
+        `parser='lalr'` selects the LALR grammar of the profile, when one is
+        available, with the contextual lexer and falls back to Earley for
+        messages it rejects.
+
+        Titles longer than `max_title_length` are truncated, bodies larger
+        than `max_body_size` are skipped so only trailers are parsed and
+        messages that take longer than `timeout` seconds to parse are only
+        classified from their header.
+        """
+        self.__options = dict(kwargs, grammar_path=grammar_path, start=start)
         self.types = kwargs.pop('types', ['feat', 'fix'])
         self.scopes = kwargs.pop('scopes', [])
-        self.__parser = Lark.open(grammar_path, start=start, **kwargs)
+        self.profile = get_profile(kwargs.pop('profile', 'conventional'))
+        self.max_title_length = kwargs.pop('max_title_length', None)
+        self.max_body_size = kwargs.pop('max_body_size', None)
+        self.timeout = kwargs.pop('timeout', None)
+        self.__cache_dir = kwargs.pop('cache_dir', CACHE_DIR)
+        self.__start = start
+        self.__fallback: Optional['Lark'] = None
+
+        lalr_grammar_path = grammar_path or self.profile.lalr_grammar_path
+        if kwargs.get('parser') == 'lalr' and lalr_grammar_path:
+            kwargs.setdefault('lexer', 'contextual')
+            self.__use_fallback = grammar_path is None
+            grammar_path = lalr_grammar_path
+        else:
+            kwargs.pop('parser', None)
+            self.__use_fallback = False
+            grammar_path = grammar_path or self.profile.grammar_path
+
+        self.__parser = get_parser(
+            grammar_path, cache_dir=self.__cache_dir, start=start, **kwargs
+        )
+
+    @property
+    def _fallback(self) -> 'Lark':
+        """Get Earley parser for messages rejected by LALR."""
+        if self.__fallback is None:
+            self.__fallback = get_parser(
+                self.profile.grammar_path,
+                cache_dir=self.__cache_dir,
+                start=self.__start,
+            )
+        return self.__fallback
 
     def parse(
         self,
         text: str,
         start: Optional[str] = None,
         on_error: Optional[Callable[['UnexpectedInput'], bool]] = None,
+        header_only: bool = False,
+        tolerant: bool = False,
     ) -> None:
-        """Parse commit message."""
-        self.__tree = self.__parser.parse(
-            text, start=start, on_error=on_error  # type: ignore
+        """Parse commit message.
+
+        With `header_only` the title and breaking change are matched with
+        regular expressions, using the grammar only when they are unsure.
+
+        With `tolerant` nonconforming messages do not raise. Messages the
+        grammar rejects are recovered from their header when possible and
+        the rest are left without a type to be tagged as misc. Messages
+        without a type skip the grammar and only their breaking change is
+        matched, so they only conform when the profile accepts them. Issues
+        and trailers of both are matched from the last paragraph.
+        """
+        if tolerant:
+            if self.profile.header.match(text.lstrip()) is None:
+                # NOTE: skip the grammar for messages without a type
+                self.__commit = replace(
+                    _misc_commit(text), degraded=not self.profile.untyped
+                )
+                return
+            try:
+                self.parse(text, start, on_error, header_only)
+            except LarkError:
+                commit = match_header(text) if self.profile.fast_path else None
+                issues, trailers = match_footer(text)
+                self.__commit = replace(
+                    commit or _misc_commit(text),
+                    issues=issues,
+                    trailers=trailers,
+                    degraded=True,
+                )
+            return
+
+        self.__commit = (
+            match_header(text)
+            if header_only and self.profile.fast_path
+            else None
         )
+        if self.__commit is not None:
+            return
 
-    def _get_section(self, name: str) -> Optional[Any]:
-        """Get commit message section."""
-        for arg in self.__tree.children:
-            # NOTE: will not have parse tree for non-match
-            if hasattr(arg, '__dict__') and vars(arg)['data'] == name:
-                return arg
-        return None
+        text, degraded = self._limit(text)
+        try:
+            with time_limit(self.timeout):
+                if self.__use_fallback and on_error is None:
+                    try:
+                        tree = self.__parser.parse(text, start=start)
+                    except UnexpectedInput:
+                        tree = self._fallback.parse(text, start=start)
+                else:
+                    tree = self.__parser.parse(
+                        text, start=start, on_error=on_error  # type: ignore
+                    )
+        except ParseTimeoutError as err:
+            log.warning('classifying commit from header only: %s', err)
+            commit = (
+                match_header(text) if self.profile.fast_path else None
+            ) or _misc_commit(text)
+            self.__commit = replace(commit, degraded=True)
+            return
+        self.__commit = self._normalize(
+            ParsedCommit.from_tree(tree, degraded=degraded)
+        )
+
+    def _normalize(self, commit: ParsedCommit) -> ParsedCommit:
+        """Map intention of the commit to a conventional commit type."""
+        if not self.profile.types or commit.type is None:
+            return commit
+        kind = self.profile.types.get(
+            commit.type.replace('\ufe0f', ''), 'chore'
+        )
+        return replace(
+            commit,
+            type=kind.rstrip('!'),
+            breaking=commit.breaking or kind.endswith('!'),
+        )
+
+    def _limit(self, text: str) -> Tuple[str, bool]:
+        """Apply size limits to commit message."""
+        title, _, body = text.lstrip().partition('\n')
+        degraded = False
+
+        if self.max_title_length and len(title) > self.max_title_length:
+            title = title[: self.max_title_length]
+            degraded = True
+
+        if self.max_body_size and len(body) > self.max_body_size:
+            # NOTE: only trailers are scanned from oversized bodies
+            footer: List[str] = []
+            size = 0
+            for line in reversed(body.rstrip().splitlines()):
+                if not line.strip():
+                    break
+                size += len(line) + 1
+                if size > self.max_body_size:
+                    break
+                if FOOTER_REGEX.match(line):
+                    footer.insert(0, line)
+            body = '\n\n' + '\n'.join(footer) if footer else ''
+            degraded = True
+
+        if degraded:
+            log.debug('limited commit message size: %r', title)
+            return title + '\n' + body, True
+        return text, False
+
+    def _parse_record(
+        self, text: str, header_only: bool = False, tolerant: bool = False
+    ) -> ParsedCommit:
+        """Parse commit message into an immutable record."""
+        self.parse(text, header_only=header_only, tolerant=tolerant)
+        return self.commit
+
+    def parse_many(
+        self,
+        messages: Iterable[Union[str, ParsedCommit]],
+        workers: int = 1,
+        chunksize: int = 256,
+        header_only: bool = False,
+        tolerant: bool = False,
+        stats: Optional[ParseStats] = None,
+    ) -> Iterator[ParsedCommit]:
+        """Parse many commit messages and yield results in order.
+
+        Parameters
+        ----------
+        messages: Iterable[Union[str, ParsedCommit]]
+            Commit messages to be parsed. Commits that are already parsed,
+            such as cached ones, are passed through in order.
+        workers: int
+            Number of processes used to parse the messages.
+        chunksize: int
+            Number of messages sent to a worker at a time.
+        header_only: bool
+            Only classify the title and breaking change of each message.
+        tolerant: bool
+            Classify nonconforming messages as misc instead of raising.
+        stats: ParseStats
+            Statistics updated with the outcome of each message.
+
+        """
+        records = self._parse_many(
+            messages, workers, chunksize, header_only, tolerant
+        )
+        if stats is None:
+            yield from records
+            return
+
+        start = time.perf_counter()
+        for commit in records:
+            stats.add(commit, time.perf_counter() - start)
+            yield commit
+            start = time.perf_counter()
+
+    def _parse_many(
+        self,
+        messages: Iterable[Union[str, ParsedCommit]],
+        workers: int,
+        chunksize: int,
+        header_only: bool,
+        tolerant: bool,
+    ) -> Iterator[ParsedCommit]:
+        """Parse many commit messages serially or across processes."""
+        if workers <= 1:
+            for message in messages:
+                yield (
+                    message
+                    if isinstance(message, ParsedCommit)
+                    else self._parse_record(message, header_only, tolerant)
+                )
+            return
+
+        iterator = iter(messages)
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(self.__options,),
+        ) as executor:
+            # NOTE: bound chunks in flight to keep memory constant
+            pending: Deque[Future] = deque()
+            while True:
+                while len(pending) < workers * 2:
+                    chunk = list(islice(iterator, chunksize))
+                    if not chunk:
+                        break
+                    pending.append(
+                        executor.submit(
+                            _parse_chunk, chunk, header_only, tolerant
+                        )
+                    )
+                if not pending:
+                    break
+                yield from pending.popleft().result()
+
+    @property
+    def commit(self) -> ParsedCommit:
+        """Get result of the last parsed commit message."""
+        if self.__commit is None:
+            raise AttributeError('no commit message has been parsed')
+        return self.__commit
 
     @property
     def title(self) -> Dict[str, Any]:
         """Get title section of commit message."""
         title: Dict[str, Any] = defaultdict(lambda: None)
-        section = self._get_section('title')
-        if section:
-            for arg in section.children:
-                title[arg.data] = next(
-                    (x.value.strip() for x in arg.children), True
-                )
+        if self.__commit is not None:
+            if self.__commit.type is not None:
+                title['type'] = self.__commit.type
+            if self.__commit.scope is not None:
+                title['scope'] = self.__commit.scope
+            if self.__commit.breaking:
+                title['break'] = True
+            title['description'] = self.__commit.description
         return title
 
     @property
     def body(self) -> List[str]:
         """Get body section of commit message."""
-        section = self._get_section('body')
-        if section:
-            return [arg.value.strip() for arg in section.children]
-        return []
+        return list(self.__commit.body) if self.__commit else []
 
     @property
     def footer(self) -> Dict[str, Any]:
         """Get footer section of commit message."""
         footer: Dict[str, Any] = defaultdict(lambda: None)
         footer['issues'] = []
-
-        section = self._get_section('footer')
-        if section:
-            for arg in section.children:
-                if arg.data == 'breaking_change':
-                    footer['breaking_change'] = next(
-                        (x.value.strip() for x in arg.children), 'Unknown'
-                    )
-                if arg.data == 'issue':
-                    # Refs
-                    # Fix
-                    footer['issues'].append(
-                        {arg.children[0].value: arg.children[1].value.strip()}
-                    )
-                if arg.data == 'trailer':
-                    footer['trailer'] = {}
-                    for x, y in enumerate(arg.children):
-                        if x == 0:
-                            # Acked-by
-                            # Cc
-                            # Helped-by
-                            # Reviewed-by
-                            # Reported-by
-                            # Signed-off-by
-                            # Tested-by
-                            footer['trailer']['token'] = y.value.strip()
-                        if x == 1:
-                            footer['trailer']['name'] = y.value.strip()
-                        if x == 2:
-                            footer['trailer']['email'] = y.value.strip()
+        if self.__commit is not None:
+            if self.__commit.breaking_change is not None:
+                footer['breaking_change'] = self.__commit.breaking_change
+            footer['issues'] = [{k: v} for k, v in self.__commit.issues]
+            if self.__commit.trailers:
+                token, name, email = self.__commit.trailers[-1]
+                footer['trailer'] = {
+                    'token': token,
+                    'name': name,
+                    'email': email,
+                }
         return footer
@@ -0,0 +1,276 @@
+# copyright: (c) 2021 by Jesse Johnson.
+# license: LGPL-3.0, see LICENSE.md for more details.
+"""Provide compiled commit message parsers."""
+
+import hashlib
+import logging
+import os
+import pickle  # nosec
+import re
+import sys
+import threading
+from collections import Counter
+from dataclasses import dataclass, field
+from itertools import islice
+from typing import (
+    IO,
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Optional,
+    Pattern,
+    Tuple,
+)
+
+from lark import Lark
+from lark import __version__ as lark_version
+from lark.load_grammar import Grammar, load_grammar  # type: ignore
+
+from versioning.config import (
+    ANGULAR_GRAMMAR_PATH,
+    CACHE_DIR,
+    GITMOJI_GRAMMAR_PATH,
+    GRAMMAR_PATH,
+    LALR_GRAMMAR_PATH,
+    TICKET_GRAMMAR_PATH,
+)
+from versioning.exception import VersioningException
+from versioning.files import atomic_write
+
+log = logging.getLogger(__name__)
+
+_parsers: Dict[Tuple[str, str], Lark] = {}
+_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class GrammarProfile:
+    """Describe a commit message convention and its grammars.
+
+    The `header` pattern is a cheap heuristic matching titles that may
+    follow the convention and `types` maps the intentions of a convention
+    to conventional commit types, where a trailing `!` marks a breaking
+    change. Profiles that are `untyped` accept titles without a type.
+    """
+
+    name: str
+    grammar_path: str
+    header: Pattern[str]
+    lalr_grammar_path: Optional[str] = None
+    types: Dict[str, str] = field(default_factory=dict)
+    fast_path: bool = False
+    untyped: bool = False
+
+
+GITMOJI_TYPES: Dict[str, str] = {
+    'sparkles': 'feat',
+    '\u2728': 'feat',
+    'boom': 'feat!',
+    '\U0001f4a5': 'feat!',
+    'bug': 'fix',
+    '\U0001f41b': 'fix',
+    'ambulance': 'fix',
+    '\U0001f691': 'fix',
+    'lock': 'fix',
+    '\U0001f512': 'fix',
+    'memo': 'docs',
+    '\U0001f4dd': 'docs',
+    'zap': 'perf',
+    '\u26a1': 'perf',
+    'recycle': 'refactor',
+    '\u267b': 'refactor',
+    'fire': 'refactor',
+    '\U0001f525': 'refactor',
+    'art': 'style',
+    '\U0001f3a8': 'style',
+    'white_check_mark': 'test',
+    '\u2705': 'test',
+    'construction_worker': 'ci',
+    '\U0001f477': 'ci',
+    'green_heart': 'ci',
+    '\U0001f49a': 'ci',
+    'arrow_up': 'build',
+    '\u2b06': 'build',
+    'arrow_down': 'build',
+    '\u2b07': 'build',
+    'package': 'build',
+    '\U0001f4e6': 'build',
+    'rewind': 'revert',
+    '\u23ea': 'revert',
+    'bookmark': 'release',
+    '\U0001f516': 'release',
+}
+
+DEFAULT_PROFILE = 'conventional'
+
+# NOTE: profiles are ordered from most to least specific
+PROFILES: Dict[str, GrammarProfile] = {
+    'ticket': GrammarProfile(
+        name='ticket',
+        grammar_path=TICKET_GRAMMAR_PATH,
+        header=re.compile(r'\[?[A-Z][A-Z0-9]+-\d+\]?:? '),
+    ),
+    'gitmoji': GrammarProfile(
+        name='gitmoji',
+        grammar_path=GITMOJI_GRAMMAR_PATH,
+        header=re.compile(
+            r'(?::[a-z0-9_+-]+:|[\u2190-\u2bff\U0001f000-\U0001faff])'
+        ),
+        types=GITMOJI_TYPES,
+    ),
+    'conventional': GrammarProfile(
+        name='conventional',
+        grammar_path=GRAMMAR_PATH,
+        header=re.compile(r':?\s*[A-Za-z_][A-Za-z0-9_]*\s*[:(!]'),
+        lalr_grammar_path=LALR_GRAMMAR_PATH,
+        fast_path=True,
+        untyped=True,
+    ),
+    'angular': GrammarProfile(
+        name='angular',
+        grammar_path=ANGULAR_GRAMMAR_PATH,
+        header=re.compile(
+            r'(?:build|ci|docs|feat|fix|perf|refactor|revert|style|test)'
+            r'(?:\([^()\r\n]*\))?!?: '
+        ),
+    ),
+}
+
+
+def get_profile(name: str) -> GrammarProfile:
+    """Get commit message convention by name."""
+    if name not in PROFILES:
+        raise VersioningException(f"unknown commit message profile: {name}")
+    return PROFILES[name]
+
+
+def detect_profile(
+    messages: Iterable[str],
+    sample: int = 50,
+    default: str = DEFAULT_PROFILE,
+) -> str:
+    """Detect commit message convention from a sample of messages.
+
+    Titles are only matched against the header heuristic of each profile.
+    Ties are won by the more specific profile, so `angular` is never
+    detected since its titles are a subset of conventional commits.
+    """
+    counts: Counter = Counter()
+    for message in islice(messages, sample):
+        title = message.lstrip().partition('\n')[0]
+        for name, profile in PROFILES.items():
+            if profile.header.match(title):
+                counts[name] += 1
+    if not counts:
+        return default
+    best = max(PROFILES, key=lambda x: counts[x])
+    log.debug('detected commit message profile %r: %s', best, dict(counts))
+    return best
+
+
+def get_cache_key(grammar_path: str, **options: Any) -> str:
+    """Get cache key from grammar contents and parser options."""
+    with open(grammar_path, 'rb') as file:
+        digest = hashlib.sha256(file.read())
+    digest.update(lark_version.encode('utf-8'))
+    digest.update(repr(sys.version_info[:2]).encode('utf-8'))
+    digest.update(repr(sorted(options.items())).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _load_grammar(grammar_path: str, **options: Any) -> Grammar:
+    """Analyze grammar file and its imports."""
+    with open(grammar_path, encoding='utf-8') as file:
+        result = load_grammar(
+            file.read(),
+            grammar_path,
+            options.get('import_paths', []),
+            options.get('keep_all_tokens', False),
+        )
+    # NOTE: newer lark releases also return the imported files
+    return result[0] if isinstance(result, tuple) else result
+
+
+def _read_cache(cache_path: str, loader: Callable[[IO[bytes]], Any]) -> Any:
+    """Read cached parser data."""
+    try:
+        with open(cache_path, 'rb') as file:
+            return loader(file)
+    except FileNotFoundError:
+        return None
+    except Exception as err:  # pylint: disable=broad-except
+        log.debug('unable to read parser cache %r: %s', cache_path, err)
+        return None
+
+
+def _write_cache(cache_path: str, dumper: Callable[[IO[bytes]], None]) -> None:
+    """Write parser data to cache."""
+    try:
+        with atomic_write(cache_path, 'wb') as file:
+            dumper(file)
+        log.debug('saved parser cache: %r', cache_path)
+    except Exception as err:  # pylint: disable=broad-except
+        log.debug('unable to write parser cache %r: %s', cache_path, err)
+
+
+def _dump_grammar(grammar: Grammar) -> Callable[[IO[bytes]], None]:
+    """Get writer for analyzed grammar."""
+
+    def dump(file: IO[bytes]) -> None:
+        pickle.dump(grammar, file, protocol=pickle.HIGHEST_PROTOCOL)
+
+    return dump
+
+
+def _build_parser(
+    grammar_path: str, cache_dir: Optional[str], **options: Any
+) -> Lark:
+    """Build parser using the analyzed grammar cache when available."""
+    if cache_dir is None:
+        return Lark.open(grammar_path, **options)
+
+    try:
+        cache_key = get_cache_key(grammar_path, **options)
+    except Exception as err:  # pylint: disable=broad-except
+        log.debug('unable to hash grammar %r: %s', grammar_path, err)
+        return Lark.open(grammar_path, **options)
+
+    if options.get('parser') == 'lalr':
+        # NOTE: lark is only able to serialize LALR parse tables
+        cache_path = os.path.join(cache_dir, f"parser-{cache_key}.pickle")
+        parser = _read_cache(cache_path, Lark.load)  # type: ignore
+        if parser is None:
+            parser = Lark.open(grammar_path, **options)
+            _write_cache(cache_path, parser.save)  # type: ignore
+        return parser
+
+    cache_path = os.path.join(cache_dir, f"grammar-{cache_key}.pickle")
+    grammar = _read_cache(cache_path, pickle.load)
+    if grammar is None:
+        grammar = _load_grammar(grammar_path, **options)
+        _write_cache(cache_path, _dump_grammar(grammar))
+    return Lark(grammar, **options)
+
+
+def get_parser(
+    grammar_path: str = GRAMMAR_PATH,
+    cache_dir: Optional[str] = CACHE_DIR,
+    **options: Any,
+) -> Lark:
+    """Get shared parser for a grammar and its options.
+
+    Parsers are compiled once per process and persisted to `cache_dir` so
+    later processes can skip analyzing the grammar.
+    """
+    key = (os.path.abspath(grammar_path), repr(sorted(options.items())))
+    with _lock:
+        if key not in _parsers:
+            _parsers[key] = _build_parser(grammar_path, cache_dir, **options)
+        return _parsers[key]
+
+
+def clear_parsers() -> None:
+    """Remove compiled parsers from the registry."""
+    with _lock:
+        _parsers.clear()
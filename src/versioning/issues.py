@@ -0,0 +1,286 @@
+# copyright: (c) 2021 by Jesse Johnson.
+# license: LGPL-3.0, see LICENSE.md for more details.
+"""Index issues and trailers referenced by commits."""
+
+import logging
+from collections import deque
+from dataclasses import dataclass
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Deque,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
+
+from pygit2.enums import SortMode
+
+from versioning.cache import Database, get_cache_path
+from versioning.config import GRAMMAR_PATH
+from versioning.grammars.conventional_commits import (
+    FOOTER_PATTERNS,
+    CommitMessageParser,
+    Footer,
+    ParsedCommit,
+    match_footer,
+)
+from versioning.grammars.registry import get_cache_key
+from versioning.vcs import TagIndex, get_range_key
+
+if TYPE_CHECKING:
+    from pygit2 import Repository
+
+log = logging.getLogger(__name__)
+
+
+# NOTE: issue numbers are stored without the leading hash
+_MATCH_VALUE = (
+    "(r.value = ? OR r.kind = 'trailer'"
+    " AND instr(r.value, '<' || ? || '>') > 0)"
+)
+
+
+def get_issue_index(
+    repo_dir: str,
+    grammar_path: str = GRAMMAR_PATH,
+    parser: str = 'earley',
+    **kwargs: Any,
+) -> 'IssueIndex':
+    """Get index of issues and trailers referenced by commits."""
+    return IssueIndex(
+        get_cache_path(repo_dir, 'issues.db'),
+        grammar=get_cache_key(
+            grammar_path,
+            parser=parser,
+            footer=FOOTER_PATTERNS,
+            fields=ParsedCommit.__slots__,
+        ),
+        **kwargs,
+    )
+
+
+@dataclass(frozen=True)
+class IssueReference:
+    """Describe an issue or trailer referenced by a commit.
+
+    The `release` is the first release that shipped the commit or `None`
+    when it is not released yet.
+    """
+
+    kind: str
+    token: str
+    value: str
+    oid: str
+    release: Optional[str]
+
+
+class IssueIndex(Database):
+    """Persist issues and trailers of commits with their releases.
+
+    The index is updated from the commit walk of each release, so only
+    commits missing from the index are parsed.
+    """
+
+    schema = (
+        (
+            'CREATE TABLE IF NOT EXISTS commits ('
+            ' oid TEXT NOT NULL,'
+            ' grammar TEXT NOT NULL,'
+            ' release TEXT,'
+            ' PRIMARY KEY (oid, grammar)'
+            ')'
+        ),
+        (
+            'CREATE TABLE IF NOT EXISTS refs ('
+            ' oid TEXT NOT NULL,'
+            ' grammar TEXT NOT NULL,'
+            ' kind TEXT NOT NULL,'
+            ' token TEXT NOT NULL,'
+            ' value TEXT NOT NULL'
+            ')'
+        ),
+        'CREATE INDEX IF NOT EXISTS refs_value ON refs (value)',
+        'CREATE INDEX IF NOT EXISTS refs_oid ON refs (oid)',
+        'CREATE INDEX IF NOT EXISTS commits_release ON commits (release)',
+        (
+            'CREATE TABLE IF NOT EXISTS releases ('
+            ' name TEXT NOT NULL,'
+            ' grammar TEXT NOT NULL,'
+            ' range TEXT NOT NULL,'
+            ' PRIMARY KEY (name, grammar)'
+            ')'
+        ),
+    )
+
+    def __init__(self, path: str, grammar: str) -> None:
+        """Initialize issue index."""
+        super().__init__(path)
+        self.grammar = grammar
+
+    def clear(self) -> None:
+        """Remove all commits from index."""
+        self.connection.execute('DELETE FROM commits')
+        self.connection.execute('DELETE FROM refs')
+        self.connection.execute('DELETE FROM releases')
+        self.connection.commit()
+
+    def _walk(
+        self, repo: 'Repository'
+    ) -> Iterator[Tuple[Optional[str], str, List[str]]]:
+        """Get ranges of releases and unreleased commits to walk.
+
+        Ranges already indexed with the same tag and earlier releases are
+        skipped.
+        """
+        indexed = dict(
+            self.connection.execute(
+                'SELECT name, range FROM releases WHERE grammar = ?',
+                (self.grammar,),
+            )
+        )
+        index = TagIndex(repo)
+        releases = index.distinct()
+        frontiers = index.frontiers(releases)
+        for release, hidden in zip(releases, frontiers):
+            key = get_range_key(release.oid, hidden)
+            if indexed.get(release.name) != key:
+                yield release.name, release.oid, hidden
+                self.connection.execute(
+                    'INSERT OR REPLACE INTO releases VALUES (?, ?, ?)',
+                    (release.name, self.grammar, key),
+                )
+        if not repo.head_is_unborn:
+            yield None, str(repo.head.target), frontiers[-1]
+
+    def update(
+        self,
+        repo: 'Repository',
+        parser: Optional[CommitMessageParser] = None,
+        workers: int = 1,
+    ) -> int:
+        """Add commits missing from the index and return their count."""
+        parser = parser or CommitMessageParser()
+        known: Dict[str, Optional[str]] = dict(
+            self.connection.execute(
+                'SELECT oid, release FROM commits WHERE grammar = ?',
+                (self.grammar,),
+            )
+        )
+        jobs: Deque[Tuple[str, Optional[str], Footer]] = deque()
+
+        def messages() -> Iterator[str]:
+            for release, oid, hidden in self._walk(repo):
+                walker = repo.walk(oid, SortMode.TOPOLOGICAL)
+                for x in hidden:
+                    walker.hide(x)
+                for commit in walker:
+                    commit_oid = str(commit.id)
+                    if commit_oid not in known:
+                        known[commit_oid] = release
+                        message = commit.message.rstrip()
+                        jobs.append(
+                            (commit_oid, release, match_footer(message))
+                        )
+                        yield message
+                    elif known[commit_oid] != release:
+                        # NOTE: an earlier release was tagged afterwards
+                        known[commit_oid] = release
+                        self.connection.execute(
+                            'UPDATE commits SET release = ?'
+                            ' WHERE oid = ? AND grammar = ?',
+                            (release, commit_oid, self.grammar),
+                        )
+
+        count = 0
+        try:
+            for parsed in parser.parse_many(
+                messages(), workers=workers, tolerant=True
+            ):
+                oid, release, footer = jobs.popleft()
+                self._add(oid, release, parsed, footer)
+                count += 1
+        except BaseException:
+            # NOTE: ranges are only recorded with all of their commits
+            self.connection.rollback()
+            raise
+        self.connection.commit()
+        log.info('indexed %d commits', count)
+        return count
+
+    def _add(
+        self,
+        oid: str,
+        release: Optional[str],
+        parsed: ParsedCommit,
+        footer: Footer = ((), ()),
+    ) -> None:
+        """Add references of a parsed commit and its matched footer."""
+        # NOTE: the grammar may read a lone footer paragraph as the body
+        issues = dict.fromkeys(parsed.issues + footer[0])
+        trailers = dict.fromkeys(parsed.trailers + footer[1])
+        self.connection.execute(
+            'INSERT OR REPLACE INTO commits VALUES (?, ?, ?)',
+            (oid, self.grammar, release),
+        )
+        self.connection.executemany(
+            'INSERT INTO refs VALUES (?, ?, ?, ?, ?)',
+            [
+                (oid, self.grammar, 'issue', token, value)
+                for token, value in issues
+            ]
+            + [
+                (oid, self.grammar, 'trailer', token, f"{name} <{email}>")
+                for token, name, email in trailers
+            ],
+        )
+
+    def _query(self, where: str, *args: Any) -> List[IssueReference]:
+        """Get references matching a condition."""
+        return [
+            IssueReference(*x)
+            for x in self.connection.execute(
+                'SELECT r.kind, r.token, r.value, r.oid, c.release'
+                ' FROM refs r JOIN commits c'
+                ' ON c.oid = r.oid AND c.grammar = r.grammar'
+                f" WHERE r.grammar = ? AND {where}"
+                ' ORDER BY r.rowid',
+                (self.grammar, *args),
+            )
+        ]
+
+    def get_release(self, name: Optional[str]) -> List[IssueReference]:
+        """Get references of commits first shipped in a release.
+
+        Unreleased commits are selected when `name` is `None`.
+        """
+        if name is None:
+            return self._query('c.release IS NULL')
+        return self._query('c.release = ?', name)
+
+    def find(self, value: str) -> List[IssueReference]:
+        """Get references to an issue key or trailer.
+
+        Trailers are found by their token, their email or their whole
+        value, and a `token:value` query only matches references with
+        that token.
+        """
+        token, sep, rest = value.partition(':')
+        if sep and token.strip() and rest.strip():
+            key = rest.strip().lstrip('#')
+            return self._query(
+                f"r.token = ? COLLATE NOCASE AND {_MATCH_VALUE}",
+                token.strip(),
+                key,
+                key,
+            )
+        key = value.lstrip('#')
+        return self._query(
+            "(r.kind = 'trailer' AND r.token = ? COLLATE NOCASE"
+            f" OR {_MATCH_VALUE})",
+            value,
+            key,
+            key,
+        )
@@ -0,0 +1,260 @@
+# copyright: (c) 2021 by Jesse Johnson.
+# license: LGPL-3.0, see LICENSE.md for more details.
+"""Profile memory allocations of pipeline phases."""
+
+import json
+import logging
+import os
+import sys
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+)
+
+try:
+    import resource
+except ImportError:  # pragma: no cover
+    # NOTE: peak RSS is only available on unix
+    resource = None  # type: ignore
+
+log = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+
+def get_peak_rss() -> Optional[int]:
+    """Get peak resident set size over the life of the process in bytes."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # NOTE: linux reports kibibytes while macos reports bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def get_rss(fd: Optional[int] = None) -> Optional[int]:
+    """Get current resident set size of the process in bytes.
+
+    A descriptor of `/proc/self/statm` may be kept open by the caller to
+    read it repeatedly.
+    """
+    try:
+        if fd is None:
+            with open('/proc/self/statm', 'rb') as file:
+                data = file.read()
+        else:
+            data = os.pread(fd, 64, 0)
+        return int(data.split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        # NOTE: current RSS is only read from procfs
+        return None
+
+
+@dataclass
+class AllocationSite:
+    """Describe memory allocated from a source line during a phase."""
+
+    site: str
+    size: int
+    count: int
+
+
+@dataclass
+class PhaseProfile:
+    """Describe memory used by a pipeline phase.
+
+    The `peak` is the highest traced memory while the phase ran and
+    `rss_delta` is the change of resident memory across the phase.
+    """
+
+    name: str
+    allocated: int = 0
+    peak: Optional[int] = None
+    rss_delta: Optional[int] = None
+    sites: List[AllocationSite] = field(default_factory=list)
+
+
+class MemoryProfiler:
+    """Take tracemalloc snapshots around each phase of a pipeline.
+
+    Allocations are compared between the start and end of a phase and
+    phases entered again with the same name are added up. A phase entered
+    within another one suspends it, so allocations are only counted once.
+    Iterables can be tracked item by item within a streaming pipeline.
+    Allocations made by worker processes are not traced.
+    """
+
+    def __init__(self, top: int = 10, frames: int = 1) -> None:
+        """Initialize memory profiler."""
+        self.top = top
+        self.frames = frames
+        self.phases: List[PhaseProfile] = []
+        self.__sites: Dict[str, Dict[str, List[int]]] = {}
+        self.__stack: List[Tuple[PhaseProfile, Any, int, Optional[int]]] = []
+        self.__statm: Optional[int] = None
+
+    def __enter__(self) -> 'MemoryProfiler':
+        """Start tracing memory allocations."""
+        self.start()
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        """Stop tracing memory allocations."""
+        self.stop()
+
+    def start(self) -> None:
+        """Start tracing memory allocations."""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+        if self.__statm is None:
+            try:
+                self.__statm = os.open('/proc/self/statm', os.O_RDONLY)
+            except OSError:
+                # NOTE: current RSS is only read from procfs
+                pass
+
+    def stop(self) -> None:
+        """Stop tracing memory allocations."""
+        tracemalloc.stop()
+        if self.__statm is not None:
+            os.close(self.__statm)
+            self.__statm = None
+
+    def _get_rss(self) -> Optional[int]:
+        """Get current resident set size without reopening procfs."""
+        return None if self.__statm is None else get_rss(self.__statm)
+
+    def _begin(self, profile: PhaseProfile, snapshot: Any = None) -> None:
+        """Start measuring a segment of a phase."""
+        start, _ = tracemalloc.get_traced_memory()
+        if hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+        self.__stack.append((profile, snapshot, start, self._get_rss()))
+
+    def _end(self, sites: bool = True) -> Tuple[PhaseProfile, Any]:
+        """Add measures of the current segment to its phase.
+
+        Allocation sites are only compared when `sites` is set and the
+        segment started from a snapshot, otherwise the snapshot is returned
+        so the phase can be resumed with it.
+        """
+        profile, before, start, rss = self.__stack.pop()
+        current, peak = tracemalloc.get_traced_memory()
+        rss_end = self._get_rss()
+        profile.allocated += current - start
+        # NOTE: the peak is only scoped to the phase when it can be reset
+        if hasattr(tracemalloc, 'reset_peak'):
+            profile.peak = max(profile.peak or 0, peak)
+        if rss is not None and rss_end is not None:
+            profile.rss_delta = (profile.rss_delta or 0) + rss_end - rss
+        if not sites or before is None:
+            return profile, before
+
+        ignored = {tracemalloc.__file__, __file__}
+        totals = self.__sites[profile.name]
+        for x in tracemalloc.take_snapshot().compare_to(before, 'lineno'):
+            # NOTE: allocations of the profiler itself are not reported
+            if x.traceback[0].filename in ignored:
+                continue
+            site = totals.setdefault(str(x.traceback[0]), [0, 0])
+            site[0] += x.size_diff
+            site[1] += x.count_diff
+        profile.sites = [
+            AllocationSite(site=k, size=v[0], count=v[1])
+            for k, v in sorted(totals.items(), key=lambda x: -x[1][0])[
+                : self.top
+            ]
+            if v[0] > 0
+        ]
+        return profile, None
+
+    def _get_phase(self, name: str) -> PhaseProfile:
+        """Get profile of a phase by name."""
+        profile = next((x for x in self.phases if x.name == name), None)
+        if profile is None:
+            profile = PhaseProfile(name=name)
+            self.phases.append(profile)
+            self.__sites[name] = {}
+        return profile
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[PhaseProfile]:
+        """Profile memory allocated within a phase."""
+        profile = self._get_phase(name)
+        if not tracemalloc.is_tracing():
+            yield profile
+            return
+
+        outer = self._end() if self.__stack else None
+        self._begin(profile, tracemalloc.take_snapshot())
+        try:
+            yield profile
+        finally:
+            self._end()
+            if outer is not None:
+                self._begin(outer[0], tracemalloc.take_snapshot())
+            log.debug('phase %s allocated %d bytes', name, profile.allocated)
+
+    def track(self, name: str, iterable: Iterable[T]) -> Iterator[T]:
+        """Profile memory allocated while getting each item of an iterable.
+
+        Items are consumed outside of the phase, so a pipeline of iterators
+        is profiled without changing how it streams. No snapshots are taken
+        for each item, so allocation sites of the items are reported by the
+        phase the iterable is consumed in.
+        """
+        profile = self._get_phase(name)
+        iterator = iter(iterable)
+        while True:
+            if not tracemalloc.is_tracing():
+                yield from iterator
+                return
+            outer = self._end(sites=False) if self.__stack else None
+            self._begin(profile)
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self._end(sites=False)
+                if outer is not None:
+                    self._begin(*outer)
+            yield item
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Get profiles of phases and peak RSS of the process."""
+        return {
+            'phases': [asdict(x) for x in self.phases],
+            'peak_rss': get_peak_rss(),
+        }
+
+    def as_json(self) -> str:
+        """Get profiles of phases as JSON."""
+        return json.dumps(self.as_dict())
+
+    def as_table(self) -> str:
+        """Get profiles of phases as a text table."""
+        lines = [
+            f"{'phase':<16} {'allocated':>12} {'peak':>12} {'rss delta':>12}"
+        ]
+        for phase in self.phases:
+            peak = '-' if phase.peak is None else str(phase.peak)
+            rss = '-' if phase.rss_delta is None else str(phase.rss_delta)
+            lines.append(
+                f"{phase.name:<16} {phase.allocated:>12} "
+                f"{peak:>12} {rss:>12}"
+            )
+            for site in phase.sites:
+                lines.append(f"  {site.size:>12} {site.count:>8} {site.site}")
+        peak_rss = get_peak_rss()
+        if peak_rss is not None:
+            lines.append(f"{'peak rss':<16} {peak_rss:>12}")
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,136 @@
+# copyright: (c) 2021 by Jesse Johnson.
+# license: LGPL-3.0, see LICENSE.md for more details.
+"""Index the first release containing each commit."""
+
+import hashlib
+import logging
+from typing import TYPE_CHECKING, Dict, Optional
+
+from pygit2 import Commit
+from pygit2.enums import SortMode
+
+from versioning.cache import Database, get_cache_path
+from versioning.vcs import TagIndex, get_range_key
+
+if TYPE_CHECKING:
+    from pygit2 import Repository
+
+log = logging.getLogger(__name__)
+
+
+def get_release_index(repo_dir: str) -> 'ReleaseIndex':
+    """Get index of the first release containing each commit."""
+    return ReleaseIndex(get_cache_path(repo_dir, 'releases.db'))
+
+
+class ReleaseIndex(Database):
+    """Persist the first release containing each commit.
+
+    Releases are ordered topologically by the tag index and each release
+    covers the commits reachable from its tag that are not reachable from
+    the frontier of earlier releases, so every commit belongs to the first
+    release containing it. The index is only updated
+    when tag references change and then only ranges of changed releases
+    are walked again.
+    """
+
+    schema = (
+        (
+            'CREATE TABLE IF NOT EXISTS commits ('
+            ' oid TEXT NOT NULL PRIMARY KEY,'
+            ' release TEXT NOT NULL'
+            ')'
+        ),
+        'CREATE INDEX IF NOT EXISTS commits_release ON commits (release)',
+        (
+            'CREATE TABLE IF NOT EXISTS ranges ('
+            ' name TEXT NOT NULL PRIMARY KEY,'
+            ' key TEXT NOT NULL'
+            ')'
+        ),
+        (
+            'CREATE TABLE IF NOT EXISTS state ('
+            ' name TEXT NOT NULL PRIMARY KEY,'
+            ' value TEXT NOT NULL'
+            ')'
+        ),
+    )
+
+    @staticmethod
+    def _tags_key(repo: 'Repository') -> str:
+        """Get key of the tag references without peeling them."""
+        digest = hashlib.sha256()
+        for name in sorted(repo.listall_references()):
+            if name.startswith(TagIndex.prefix):
+                target = repo.references[name].target
+                digest.update(f"{name}={target}\n".encode('utf-8'))
+        return digest.hexdigest()
+
+    def update(self, repo: 'Repository') -> int:
+        """Index commits of changed releases and return their count."""
+        tags_key = self._tags_key(repo)
+        row = self.connection.execute(
+            "SELECT value FROM state WHERE name = 'tags'"
+        ).fetchone()
+        if row is not None and row[0] == tags_key:
+            return 0
+
+        ranges: Dict[str, str] = dict(
+            self.connection.execute('SELECT name, key FROM ranges')
+        )
+        index = TagIndex(repo)
+        releases = index.distinct()
+        frontiers = index.frontiers(releases)
+        count = 0
+        try:
+            for name in set(ranges) - {x.name for x in releases}:
+                self.connection.execute(
+                    'DELETE FROM commits WHERE release = ?', (name,)
+                )
+                self.connection.execute(
+                    'DELETE FROM ranges WHERE name = ?', (name,)
+                )
+            for release, hidden in zip(releases, frontiers):
+                key = get_range_key(release.oid, hidden)
+                if ranges.get(release.name) == key:
+                    continue
+                self.connection.execute(
+                    'DELETE FROM commits WHERE release = ?', (release.name,)
+                )
+                walker = repo.walk(release.oid, SortMode.TOPOLOGICAL)
+                for x in hidden:
+                    walker.hide(x)
+                oids = [(str(x.id), release.name) for x in walker]
+                self.connection.executemany(
+                    'INSERT OR REPLACE INTO commits VALUES (?, ?)', oids
+                )
+                self.connection.execute(
+                    'INSERT OR REPLACE INTO ranges VALUES (?, ?)',
+                    (release.name, key),
+                )
+                count += len(oids)
+            self.connection.execute(
+                "INSERT OR REPLACE INTO state VALUES ('tags', ?)",
+                (tags_key,),
+            )
+        except BaseException:
+            self.connection.rollback()
+            raise
+        self.connection.commit()
+        log.info('indexed %d released commits', count)
+        return count
+
+    def get(self, oid: str) -> Optional[str]:
+        """Get name of the first release containing a commit."""
+        row = self.connection.execute(
+            'SELECT release FROM commits WHERE oid = ?', (oid,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def first_release(
+        self, repo: 'Repository', revision: str
+    ) -> Optional[str]:
+        """Get name of the first release containing a revision."""
+        oid = str(repo.revparse_single(revision).peel(Commit).id)
+        self.update(repo)
+        return self.get(oid)
@@ -0,0 +1,151 @@
+# copyright: (c) 2021 by Jesse Johnson.
+# license: LGPL-3.0, see LICENSE.md for more details.
+"""Render changelog documents."""
+
+import abc
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Type
+
+from mdutils.mdutils import MdUtils  # pylint: disable=import-error
+
+from versioning.exception import VersioningException
+from versioning.vcs import ReleaseTag
+
+Changes = Dict[str, List[List[Any]]]
+
+
+class Renderer(abc.ABC):
+    """Render changelog one release at a time."""
+
+    name = ''
+    filepath = 'CHANGELOG'
+    separator = ''
+    # NOTE: prefix shared by every release section, empty when unsupported
+    section_start = ''
+
+    def header(self) -> str:
+        """Render start of changelog."""
+        return ''
+
+    def marker(self, release: ReleaseTag) -> str:
+        """Get start of the section of a release."""
+        return self.section_start + json.dumps(release.name) + ','
+
+    @abc.abstractmethod
+    def release(self, release: ReleaseTag, changes: Changes) -> str:
+        """Render section of a release."""
+
+    def footer(self) -> str:
+        """Render end of changelog."""
+        return ''
+
+    @staticmethod
+    def to_dict(release: ReleaseTag, changes: Changes) -> Dict[str, Any]:
+        """Get structure of a release."""
+        return {
+            'name': release.name,
+            'version': str(release.version) if release.version else None,
+            'commit': release.oid,
+            'date': datetime.fromtimestamp(release.time).strftime('%Y-%m-%d'),
+            'sections': {
+                k: [
+                    {'commit': oid, 'type': kind, 'description': description}
+                    for oid, kind, description in v
+                ]
+                for k, v in changes.items()
+                if v != []
+            },
+        }
+
+
+class MarkdownRenderer(Renderer):
+    """Render changelog as Markdown tables."""
+
+    name = 'markdown'
+    filepath = 'CHANGELOG.md'
+    section_start = '\n## v'
+
+    def header(self) -> str:
+        """Render title of changelog."""
+        # stopgap until better parser is found
+        md = MdUtils(
+            file_name='',
+            title='Changelog',
+            # author='Jesse P. Johnson'
+        )
+        md.new_header(level=1, title='ProMan Versioning Changelog')
+        return md.title + md.file_data_text
+
+    def marker(self, release: ReleaseTag) -> str:
+        """Get header of the section of a release."""
+        return f"{self.section_start}{release.name} - ("
+
+    def release(self, release: ReleaseTag, changes: Changes) -> str:
+        """Render section of a release."""
+        md = MdUtils(file_name='')
+        sections = ['commit', 'type', 'description']
+        dt = datetime.fromtimestamp(release.time)
+        md.new_header(
+            level=2,
+            # title=f"[v{tag.name}]({url}) - ({dt.strftime('%Y-%m-%d')})"
+            title=f"v{release.name} - ({dt.strftime('%Y-%m-%d')})",
+            add_table_of_contents='n',
+        )
+
+        for k, v in changes.items():
+            if v != []:
+                text = sections + [x for row in v for x in row]
+                md.new_header(level=3, title=k, add_table_of_contents='n')
+                md.new_table(
+                    columns=len(sections),
+                    rows=len(text) // len(sections),
+                    text=text,
+                    text_align='left',
+                )
+        return md.file_data_text
+
+
+class JsonRenderer(Renderer):
+    """Render changelog as a JSON document."""
+
+    name = 'json'
+    filepath = 'CHANGELOG.json'
+    separator = ',\n'
+    section_start = '{"name": '
+
+    def header(self) -> str:
+        """Render start of release list."""
+        return '{"title": "ProMan Versioning Changelog", "releases": [\n'
+
+    def release(self, release: ReleaseTag, changes: Changes) -> str:
+        """Render release as a JSON object."""
+        return json.dumps(self.to_dict(release, changes))
+
+    def footer(self) -> str:
+        """Render end of release list."""
+        return '\n]}\n'
+
+
+class NdjsonRenderer(Renderer):
+    """Render changelog as one JSON object per release."""
+
+    name = 'ndjson'
+    filepath = 'CHANGELOG.ndjson'
+    section_start = '{"name": '
+
+    def release(self, release: ReleaseTag, changes: Changes) -> str:
+        """Render release as a JSON line."""
+        return json.dumps(self.to_dict(release, changes)) + '\n'
+
+
+RENDERERS: Dict[str, Type[Renderer]] = {
+    x.name: x for x in (MarkdownRenderer, JsonRenderer, NdjsonRenderer)
+}
+
+
+def get_renderer(name: str) -> Renderer:
+    """Get changelog renderer by name."""
+    if name not in RENDERERS:
+        raise VersioningException(f"unknown changelog format: {name}")
+    return RENDERERS[name]()
@@ -0,0 +1,326 @@
+# copyright: (c) 2021 by Jesse Johnson.
+# license: LGPL-3.0, see LICENSE.md for more details.
+"""Rewrite versions within files."""
+
+import hashlib
+import json
+import logging
+import mmap
+import os
+import re
+import shutil
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from string import Template
+from typing import (
+    IO,
+    Any,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Match,
+    Optional,
+    Pattern,
+    Tuple,
+)
+
+from versioning.files import atomic_write, stage_file
+
+log = logging.getLogger(__name__)
+
+# NOTE: files of at least this size are rewritten one line at a time
+STREAM_SIZE = 1048576
+# NOTE: files modified this close to a state save are verified by hash
+RACY_NS = 2000000000
+
+
+def scan_file(filepath: str, needle: bytes) -> Tuple[bool, Optional[str]]:
+    """Check if a file contains bytes and hash it when it does not.
+
+    The file is memory-mapped when possible so the search runs over its
+    bytes without decoding or copying them.
+    """
+    with open(filepath, 'rb') as file:
+        try:
+            view: Any = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            # NOTE: empty files and some filesystems cannot be mapped
+            view = file.read()
+        try:
+            if view.find(needle) != -1:
+                return True, None
+            return False, hashlib.sha256(view).hexdigest()
+        finally:
+            if isinstance(view, mmap.mmap):
+                view.close()
+
+
+# NOTE: backreferences and conditionals refer to groups by number or name
+BACKREF_REGEX = re.compile(r'(?<!\\)(?:\\\\)*\\(?:[1-9]|g<)|\(\?P=|\(\?\(')
+
+
+class Rewriter:
+    """Rewrite versions matched by all patterns of a file in a single scan.
+
+    Patterns are templates where `${version}` is replaced by a query of the
+    current version to find and by the new version to write. They are
+    compiled once into a single alternation, so at each position the first
+    matching pattern is applied. Patterns referring to their own groups or
+    sharing group names cannot be combined and are applied one after the
+    other instead.
+    """
+
+    def __init__(self, patterns: List[str], query: str) -> None:
+        """Initialize rewriter with patterns of a file."""
+        self.templates = [Template(x) for x in patterns]
+        self.patterns: List[Pattern[str]] = [
+            re.compile(x.substitute(version=query)) for x in self.templates
+        ]
+        self.regex: Optional[Pattern[str]] = None
+        if not any(BACKREF_REGEX.search(x.pattern) for x in self.patterns):
+            try:
+                self.regex = re.compile(
+                    '|'.join(
+                        f"(?P<_p{i}>{x.pattern})"
+                        for i, x in enumerate(self.patterns)
+                    )
+                )
+            except re.error:
+                # NOTE: group names may only be defined once per regex
+                log.debug('applying patterns separately: %s', patterns)
+
+    def sub(self, text: str, version: str) -> Tuple[str, List[int]]:
+        """Replace versions in text and count the matches of each pattern."""
+        replacements = [x.substitute(version=version) for x in self.templates]
+        counts = [0] * len(self.patterns)
+        if self.regex is None:
+            for i, pattern in enumerate(self.patterns):
+                text, counts[i] = pattern.subn(replacements[i], text)
+            return text, counts
+
+        def replace(match: Match[str]) -> str:
+            for i, pattern in enumerate(self.patterns):
+                if match.start(f"_p{i}") != -1:
+                    counts[i] += 1
+                    # NOTE: groups are numbered within their own pattern
+                    found = pattern.match(text, match.start())
+                    if found is not None:
+                        return found.expand(replacements[i])
+            return match.group(0)
+
+        return self.regex.sub(replace, text), counts
+
+
+def _format_range(start: int, length: int) -> str:
+    """Format range of lines in a unified diff hunk."""
+    if length == 1:
+        return str(start)
+    return f"{start - 1 if length == 0 else start},{length}"
+
+
+def rewrite_lines(
+    lines: Iterable[str],
+    file: Optional[IO[str]],
+    rewrites: List[Tuple[Rewriter, str]],
+    fromfile: str = '',
+    context: int = 3,
+) -> Tuple[List[List[int]], List[str]]:
+    """Rewrite versions one line at a time and get counts and a diff.
+
+    Lines are written to `file` as they are rewritten, so only the lines
+    around matches are held to build the unified diff hunks. Patterns are
+    matched within a single line.
+    """
+    counts = [[0] * len(x.patterns) for x, _ in rewrites]
+    deltas: List[str] = []
+    before: Deque[str] = deque(maxlen=context)
+    hunk: List[Tuple[str, Optional[str]]] = []
+    start = gap = 0
+
+    def close() -> None:
+        trailing = gap - context
+        if trailing > 0:
+            del hunk[-trailing:]
+        if not deltas:
+            deltas.extend([f"--- {fromfile}\n", '+++ \n'])
+        span = _format_range(start, len(hunk))
+        deltas.append(f"@@ -{span} +{span} @@\n")
+        for old, new in hunk:
+            if new is None:
+                deltas.append(' ' + old.rstrip('\r\n'))
+            else:
+                deltas.append('-' + old.rstrip('\r\n'))
+                deltas.append('+' + new.rstrip('\r\n'))
+        hunk.clear()
+
+    for lineno, line in enumerate(lines, 1):
+        new = line
+        for i, (rewriter, version) in enumerate(rewrites):
+            new, found = rewriter.sub(new, version)
+            counts[i] = [x + y for x, y in zip(counts[i], found)]
+        if file is not None:
+            file.write(new)
+
+        if new != line:
+            if not hunk:
+                start = lineno - len(before)
+                hunk.extend((x, None) for x in before)
+            hunk.append((line, new))
+            gap = 0
+        elif hunk:
+            hunk.append((line, None))
+            gap += 1
+            if gap > 2 * context:
+                close()
+        before.append(line)
+    if hunk:
+        close()
+    return counts, deltas
+
+
+class RewriteTransaction:
+    """Replace rewritten files together or not at all.
+
+    Each file is staged to a temporary file within its directory and the
+    staged files replace their targets when the transaction is committed.
+    Targets are linked to a backup before being replaced, so they can be
+    restored when a later replacement fails, and staged files are removed
+    when the transaction is rolled back.
+    """
+
+    def __init__(self) -> None:
+        """Initialize rewrite transaction."""
+        self.staged: List[Tuple[str, str]] = []
+        self.__lock = threading.Lock()
+
+    def __enter__(self) -> 'RewriteTransaction':
+        """Begin transaction."""
+        return self
+
+    def __exit__(self, exc_type: Any, *args: Any) -> None:
+        """Commit transaction or roll it back on error."""
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
+
+    @contextmanager
+    def open(self, filepath: str) -> Iterator[IO[str]]:
+        """Stage a file written through a temporary file next to it."""
+        with stage_file(filepath, encoding='utf-8', newline='') as file:
+            yield file
+        with self.__lock:
+            self.staged.append((filepath, file.name))
+
+    def stage(self, filepath: str, content: str) -> None:
+        """Stage new content of a file."""
+        with self.open(filepath) as file:
+            file.write(content)
+
+    @staticmethod
+    def _backup(filepath: str, backup: str) -> None:
+        """Keep original file until the transaction is complete."""
+        try:
+            os.link(filepath, backup)
+        except OSError:
+            shutil.copy2(filepath, backup)
+
+    def commit(self) -> None:
+        """Replace files with their staged content."""
+        replaced: List[Tuple[str, str]] = []
+        try:
+            for filepath, tmp_path in self.staged:
+                backup = tmp_path + '.orig'
+                self._backup(filepath, backup)
+                try:
+                    os.replace(tmp_path, filepath)
+                except BaseException:
+                    os.remove(backup)
+                    raise
+                replaced.append((filepath, backup))
+                log.info('writting file at: %r', filepath)
+        except BaseException:
+            for filepath, backup in reversed(replaced):
+                os.replace(backup, filepath)
+                log.warning('restored file at: %r', filepath)
+            self.rollback()
+            raise
+        for _, backup in replaced:
+            os.remove(backup)
+        self.staged.clear()
+
+    def rollback(self) -> None:
+        """Remove staged files."""
+        for _, tmp_path in self.staged:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self.staged.clear()
+
+
+class RewriteState:
+    """Remember version files that did not contain a version to replace.
+
+    Files are recorded with their stat and content hash after a successful
+    update. A recorded file is skipped while its stat is unchanged, or
+    when its stat changed but its content hash did not.
+    """
+
+    def __init__(self, path: str) -> None:
+        """Initialize rewrite state."""
+        self.path = path
+        self.saved = 0
+        self.files: Dict[str, Dict[str, Any]] = {}
+        try:
+            with open(path, encoding='utf-8') as file:
+                state = json.load(file)
+            self.saved = state['saved']
+            self.files = state['files']
+        except FileNotFoundError:
+            pass
+        except (ValueError, KeyError, TypeError) as err:
+            log.debug('unable to read rewrite state %r: %s', path, err)
+
+    def is_unchanged(
+        self, filepath: str, version: str, info: os.stat_result
+    ) -> bool:
+        """Check if a file is known not to contain a version."""
+        entry = self.files.get(filepath)
+        if (
+            entry is None
+            or entry['version'] != version
+            or entry['size'] != info.st_size
+        ):
+            return False
+        if (
+            entry['mtime_ns'] == info.st_mtime_ns
+            and info.st_mtime_ns + RACY_NS < self.saved
+        ):
+            return True
+        with open(filepath, 'rb') as file:
+            digest = hashlib.sha256(file.read()).hexdigest()
+        return bool(digest == entry['sha256'])
+
+    def set(
+        self, filepath: str, version: str, info: os.stat_result, digest: str
+    ) -> None:
+        """Record a file without a version."""
+        self.files[filepath] = {
+            'version': version,
+            'size': info.st_size,
+            'mtime_ns': info.st_mtime_ns,
+            'sha256': digest,
+        }
+
+    def discard(self, filepath: str) -> None:
+        """Forget a file."""
+        self.files.pop(filepath, None)
+
+    def save(self) -> None:
+        """Write rewrite state."""
+        self.saved = time.time_ns()
+        with atomic_write(self.path, encoding='utf-8') as file:
+            json.dump({'saved': self.saved, 'files': self.files}, file)
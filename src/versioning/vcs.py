@@ -3,22 +3,228 @@
 """Parse git commit messages."""
 
 # import logging
+import hashlib
 import os
-from typing import Any, List, Optional
+from dataclasses import dataclass
+from typing import (
+    IO,
+    Any,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
 
+from packaging.version import InvalidVersion
+from packaging.version import Version as PackageVersion
 from pygit2 import (
     GIT_OBJECT_COMMIT,
     Commit,
+    GitError,
+    Oid,
     RemoteCallbacks,
     Repository,
     Signature,
     Tag,
+    Tree,
     UserPass,
 )
+from pygit2.enums import DiffOption, FileStatus, SortMode
 
 from versioning.exception import VersioningException
 
 
+def iter_log_records(
+    stream: IO[bytes], size: int = 65536
+) -> Iterator[Tuple[str, str]]:
+    """Read commit ids and messages from NUL-delimited git log output.
+
+    Expects output from `git log --format=%H%x00%B%x00` and only holds the
+    record being read in memory.
+    """
+    read = getattr(stream, 'read1', stream.read)
+    pending: List[bytes] = []
+    fields: List[bytes] = []
+    while True:
+        chunk = read(size)
+        if not chunk:
+            break
+        *parts, rest = chunk.split(b'\0')
+        for part in parts:
+            pending.append(part)
+            fields.append(b''.join(pending))
+            pending = []
+            if len(fields) == 2:
+                oid, message = fields
+                fields = []
+                yield (
+                    oid.decode('ascii').strip(),
+                    message.decode('utf-8', errors='replace'),
+                )
+        if rest:
+            pending.append(rest)
+    if fields or b''.join(pending).strip():
+        raise VersioningException('incomplete commit record in git log')
+
+
+@dataclass(frozen=True)
+class ReleaseTag:
+    """Describe tag of a released commit.
+
+    The `rank` is the position of the commit in topological order, so
+    ancestors always have a lower rank.
+    """
+
+    name: str
+    oid: str
+    time: int
+    rank: int
+    version: Optional[PackageVersion] = None
+    annotated: bool = False
+
+
+def parse_tag_version(name: str) -> Optional[PackageVersion]:
+    """Parse version from tag name."""
+    try:
+        return PackageVersion(name[1:] if name[:1] in 'vV' else name)
+    except InvalidVersion:
+        return None
+
+
+def get_range_key(oid: str, hidden: List[str]) -> str:
+    """Get key of the commits reachable from a commit but not hidden ones."""
+    digest = hashlib.sha256(oid.encode('utf-8'))
+    for x in sorted(hidden):
+        digest.update(x.encode('utf-8'))
+    return digest.hexdigest()
+
+
+class TagIndex:
+    """Index tags by the commits they point to.
+
+    The index is built once from the tag references. Tags are peeled to
+    their commits and ordered topologically, with newer commits after
+    older ones on parallel branches, so releases keep a stable order.
+    Versions are parsed with `packaging` since the project `Version` is too
+    costly to build for every tag.
+    """
+
+    prefix = 'refs/tags/'
+
+    def __init__(self, repo: Repository) -> None:
+        """Initialize tag index."""
+        self.repo = repo
+        tags = []
+        for name in repo.references:
+            if not name.startswith(self.prefix):
+                continue
+            reference = repo.references[name]
+            try:
+                commit = reference.peel(Commit)
+            except GitError:
+                # NOTE: tags of trees and blobs are not releases
+                continue
+            target = repo[reference.target]
+            annotated = isinstance(target, Tag)
+            time = (
+                target.tagger.time
+                if isinstance(target, Tag) and target.tagger
+                else commit.commit_time
+            )
+            tags.append((name.split('/', 2)[2], commit.id, time, annotated))
+
+        ranks = self._ranks({x[1] for x in tags})
+        self.releases: List[ReleaseTag] = sorted(
+            (
+                ReleaseTag(
+                    name=name,
+                    oid=str(oid),
+                    time=time,
+                    rank=ranks[oid],
+                    version=parse_tag_version(name),
+                    annotated=annotated,
+                )
+                for name, oid, time, annotated in tags
+            ),
+            key=lambda x: (x.rank, x.time, x.name),
+        )
+        # NOTE: commits with several tags resolve to the newest one
+        self.__commits: Dict[str, ReleaseTag] = {
+            x.oid: x for x in self.releases
+        }
+        self.__names: Dict[str, ReleaseTag] = {
+            x.name: x for x in self.releases
+        }
+
+    def _ranks(self, oids: Set[Oid]) -> Dict[Oid, int]:
+        """Get topological order of commits in a single walk.
+
+        Commits are walked from newest to oldest and the walk stops at the
+        oldest of the commits, so only their positions are kept.
+        """
+        walker = self.repo.walk(None, SortMode.TOPOLOGICAL | SortMode.TIME)
+        for oid in oids:
+            walker.push(oid)
+        found: List[Oid] = []
+        for commit in walker:
+            if commit.id in oids:
+                found.append(commit.id)
+                if len(found) == len(oids):
+                    break
+        return {x: i for i, x in enumerate(reversed(found))}
+
+    def __contains__(self, oid: Union[str, Oid]) -> bool:
+        """Check if commit is released."""
+        return str(oid) in self.__commits
+
+    def __getitem__(self, name: str) -> ReleaseTag:
+        """Get release by tag name."""
+        return self.__names[name]
+
+    def __iter__(self) -> Iterator[ReleaseTag]:
+        """Iterate releases from oldest to newest."""
+        return iter(self.releases)
+
+    def __len__(self) -> int:
+        """Get number of release tags."""
+        return len(self.releases)
+
+    def get(self, oid: Union[str, Oid]) -> Optional[ReleaseTag]:
+        """Get release of a commit."""
+        return self.__commits.get(str(oid))
+
+    def distinct(self) -> List[ReleaseTag]:
+        """Get releases from oldest to newest with one tag per commit."""
+        return [x for x in self.releases if self.__commits[x.oid] is x]
+
+    def frontiers(
+        self, releases: Optional[List[ReleaseTag]] = None
+    ) -> List[List[str]]:
+        """Get commits to hide when walking each release.
+
+        A release covers the commits reachable from its tag that are not
+        reachable from earlier releases. Only earlier releases that are not
+        ancestors of another earlier release are hidden, which is just the
+        previous release on a linear history. A last frontier hides every
+        release to walk unreleased commits.
+        """
+        releases = self.distinct() if releases is None else releases
+        frontiers: List[List[str]] = []
+        frontier: List[ReleaseTag] = []
+        for release in releases:
+            frontiers.append([x.oid for x in frontier])
+            frontier = [
+                x
+                for x in frontier
+                if not self.repo.descendant_of(release.oid, x.oid)
+            ] + [release]
+        frontiers.append([x.oid for x in frontier])
+        return frontiers
+
+
 class Git:
     """Provide settings for git repositories."""
 
@@ -64,6 +270,40 @@ class Git:
         """Retrieve the current reference."""
         return self.repo.head.name
 
+    def is_clean(self, filepaths: Optional[List[str]] = None) -> bool:
+        """Check if tracked files have no staged or unstaged changes.
+
+        The index is compared with the last commit first and the working
+        tree is only compared when nothing is staged, without reading file
+        contents to detect binary files. When `filepaths` are provided only
+        those paths are checked, without scanning the rest of the working
+        tree. Untracked files are ignored.
+        """
+        ignored = FileStatus.WT_NEW | FileStatus.IGNORED
+        if filepaths is not None:
+            for filepath in filepaths:
+                if os.path.isabs(filepath):
+                    filepath = os.path.relpath(filepath, self.working_dir)
+                try:
+                    status = self.repo.status_file(filepath)
+                except KeyError:
+                    # NOTE: missing files are neither tracked nor dirty
+                    continue
+                if status & ~ignored:
+                    return False
+            return True
+
+        # NOTE: libgit2 builds each diff completely, so the working tree is
+        # only diffed when nothing is staged
+        flags = DiffOption.SKIP_BINARY_CHECK
+        index = self.repo.index
+        if self.repo.head_is_unborn:
+            if len(index) != 0:
+                return False
+        elif len(index.diff_to_tree(self.repo.head.peel(Tree), flags=flags)):
+            return False
+        return len(index.diff_to_workdir(flags=flags)) == 0
+
     def add_remote(
         self,
         name: str,
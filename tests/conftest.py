@@ -0,0 +1,62 @@
+# type: ignore
+"""Provide fixtures for tests."""
+
+import pytest
+from pygit2 import GIT_OBJECT_COMMIT, Signature, init_repository
+
+from versioning.grammars import conventional_commits
+
+
+class RepoBuilder:
+    """Build git history for tests."""
+
+    def __init__(self, path):
+        """Initialize repository."""
+        self.repo = init_repository(str(path))
+        self.time = 1600000000
+
+    def signature(self):
+        """Get signature with increasing timestamps."""
+        self.time += 60
+        return Signature('Tester', 'tester@example.com', self.time, 0)
+
+    def commit(self, message, parents=None):
+        """Commit empty tree and move head to it."""
+        tree = self.repo.TreeBuilder().write()
+        if parents is None:
+            parents = (
+                [] if self.repo.head_is_unborn else [self.repo.head.target]
+            )
+        sig = self.signature()
+        if self.repo.head_is_unborn:
+            return self.repo.create_commit(
+                'HEAD', sig, sig, message, tree, parents
+            )
+        oid = self.repo.create_commit(None, sig, sig, message, tree, parents)
+        self.repo.head.set_target(oid)
+        return oid
+
+    def tag(self, name, oid=None, annotated=True):
+        """Tag commit."""
+        oid = oid or self.repo.head.target
+        if annotated:
+            self.repo.create_tag(
+                name, oid, GIT_OBJECT_COMMIT, self.signature(), name
+            )
+        else:
+            self.repo.create_reference(f"refs/tags/{name}", oid)
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    """Keep parser caches out of the user cache directory."""
+    path = tmp_path / 'cache'
+    monkeypatch.setenv('XDG_CACHE_HOME', str(path))
+    monkeypatch.setattr(conventional_commits, 'CACHE_DIR', str(path))
+    return path
+
+
+@pytest.fixture
+def git_repo(tmp_path):
+    """Get builder of git history."""
+    return RepoBuilder(tmp_path / 'repo')
@@ -0,0 +1,43 @@
+# type: ignore
+"""Test batch parsing of commit messages."""
+
+from versioning.grammars.conventional_commits import CommitMessageParser
+
+messages = [
+    'fix: test',
+    'feat(ui): test',
+    'refactor!: test',
+    'docs: add a body\n\nthis is a body\nwith two lines',
+] * 8
+
+
+def test_parse_many():
+    """Test parsing messages in a single process."""
+    parser = CommitMessageParser()
+    records = list(parser.parse_many(messages))
+    assert len(records) == len(messages)
+    assert records[0].type == 'fix'
+    assert records[1].scope == 'ui'
+    assert records[2].breaking is True
+    assert records[3].body == ('this is a body', 'with two lines')
+
+
+def test_parse_many_workers():
+    """Test parsing messages across worker processes."""
+    parser = CommitMessageParser()
+    assert list(parser.parse_many(messages, workers=2, chunksize=3)) == list(
+        parser.parse_many(messages)
+    )
+
+
+def test_parse_many_passthrough():
+    """Test parsed commits are passed through in order."""
+    parser = CommitMessageParser()
+    cached = next(parser.parse_many(['docs: cached']))
+    records = list(
+        parser.parse_many(
+            ['fix: a', cached, 'feat: b'], workers=2, chunksize=1
+        )
+    )
+    assert [x.type for x in records] == ['fix', 'docs', 'feat']
+    assert records[1] == cached
@@ -0,0 +1,39 @@
+# type: ignore
+"""Test parsed commit results."""
+
+import pickle
+from dataclasses import FrozenInstanceError
+
+import pytest
+
+from versioning.grammars.conventional_commits import CommitMessageParser
+
+message = """\
+feat(ui)!: add a button
+
+BREAKING CHANGE: The old button is gone
+"""
+
+
+def test_commit():
+    """Test commit is built from the parse tree."""
+    parser = CommitMessageParser()
+    parser.parse(message)
+    commit = parser.commit
+    assert commit.type == 'feat'
+    assert commit.scope == 'ui'
+    assert commit.breaking is True
+    assert commit.description == 'add a button'
+    assert commit.breaking_change == 'The old button is gone'
+    assert commit.is_breaking is True
+
+
+def test_commit_immutable():
+    """Test commit cannot be modified and can be pickled."""
+    parser = CommitMessageParser()
+    parser.parse(message)
+    commit = parser.commit
+    with pytest.raises(FrozenInstanceError):
+        commit.type = 'fix'
+    assert not hasattr(commit, '__dict__')
+    assert pickle.loads(pickle.dumps(commit)) == commit
@@ -0,0 +1,46 @@
+# type: ignore
+"""Test commit message header fast path."""
+
+import pytest
+
+from versioning.grammars.conventional_commits import (
+    CommitMessageParser,
+    match_header,
+)
+
+messages = [
+    'test',
+    'fix: test',
+    ':sparkles:: this is a feature',
+    'feat(ui): test',
+    'refactor!: test',
+    'feat(ui)!: test',
+    'Merge branch \'master\' of https://example.com',
+    (
+        'feat: change things\n\n'
+        'Reviewed-by: Jim Henson <jim.henson@email.com>\n'
+        'BREAKING CHANGE: This could change things'
+    ),
+]
+
+
+@pytest.mark.parametrize('message', messages)
+def test_header_matches_grammar(message):
+    """Test header fast path agrees with the grammar."""
+    parser = CommitMessageParser()
+    parser.parse(message)
+    header = CommitMessageParser()
+    header.parse(message, header_only=True)
+    assert header.title == parser.title
+    assert header.footer['breaking_change'] == parser.footer['breaking_change']
+
+
+def test_header_unsure():
+    """Test header fast path defers ambiguous titles to the grammar."""
+    assert match_header('fix:test') is None
+    assert match_header('') is None
+
+    parser = CommitMessageParser()
+    parser.parse('fix :  test', header_only=True)
+    assert parser.title['type'] == 'fix'
+    assert parser.title['description'] == 'test'
@@ -0,0 +1,55 @@
+# type: ignore
+"""Test LALR commit message parser."""
+
+import pytest
+
+from versioning.grammars.conventional_commits import CommitMessageParser
+
+messages = [
+    'test',
+    'fix: test',
+    ':sparkles:: this is a feature',
+    'feat(ui): test',
+    'refactor!: test',
+    'fix :  spaced',
+    'fix(ui) : x',
+    'fix ( ui ) ! : x',
+    'Merge branch \'master\' of https://example.com',
+    """\
+fix: test a message
+
+test body of comment test
+test body of comment 2 test
+""",
+    """\
+fix(example): test a message
+
+I believe that life is basically a process of growth - that we go through many
+lives, choosing situations and problems that we will learn through.
+
+Reviewed-by: Jim H. Henson Jr. <jim.henson1@email.com>
+Refs #123
+Fix #124
+BREAKING CHANGE: This could change things
+""",
+]
+
+
+@pytest.mark.parametrize('message', messages)
+def test_lalr_matches_earley(message):
+    """Test LALR parser produces the same sections as Earley."""
+    earley = CommitMessageParser()
+    earley.parse(message)
+    lalr = CommitMessageParser(parser='lalr')
+    lalr.parse(message)
+    assert lalr.title == earley.title
+    assert lalr.body == earley.body
+    assert lalr.footer == earley.footer
+
+
+def test_lalr_fallback():
+    """Test Earley fallback for messages rejected by LALR."""
+    parser = CommitMessageParser(parser='lalr')
+    parser.parse('Merge-branch feature')
+    assert parser.title['type'] is None
+    assert parser.title['description'] == 'Merge-branch feature'
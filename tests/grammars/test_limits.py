@@ -0,0 +1,74 @@
+# type: ignore
+"""Test size limits and time budget of commit message parser."""
+
+import time
+
+from versioning.exception import ParseTimeoutError
+from versioning.grammars.conventional_commits import (
+    CommitMessageParser,
+    time_limit,
+)
+
+
+def test_limit_title_length():
+    """Test long titles are truncated."""
+    parser = CommitMessageParser(max_title_length=20)
+    parser.parse('fix: ' + 'a' * 200)
+    commit = parser.commit
+    assert commit.type == 'fix'
+    assert commit.description == 'a' * 15
+    assert commit.degraded
+
+
+def test_limit_body_size():
+    """Test oversized bodies are skipped except for trailers."""
+    parser = CommitMessageParser(max_body_size=100)
+    parser.parse(
+        'feat: large body\n\n'
+        + 'word ' * 1000
+        + '\n\nBREAKING CHANGE: removed api\nRefs #12'
+    )
+    commit = parser.commit
+    assert commit.type == 'feat'
+    assert commit.body == ()
+    assert commit.breaking_change == 'removed api'
+    assert commit.issues == (('Refs', '12'),)
+    assert commit.degraded
+
+
+def test_limit_within_bounds():
+    """Test messages within limits are not degraded."""
+    parser = CommitMessageParser(max_title_length=72, max_body_size=1000)
+    parser.parse('fix: test\n\nsmall body')
+    commit = parser.commit
+    assert commit.body == ('small body',)
+    assert not commit.degraded
+
+
+def test_time_limit():
+    """Test time budget interrupts slow work."""
+    try:
+        with time_limit(0.01):
+            time.sleep(1)
+    except ParseTimeoutError:
+        pass
+    else:
+        raise AssertionError('time budget was not enforced')
+
+
+def test_timeout_degraded(monkeypatch):
+    """Test timeouts classify commits from their header."""
+    parser = CommitMessageParser(timeout=0.01)
+
+    def slow_parse(*args, **kwargs):
+        time.sleep(1)
+
+    monkeypatch.setattr(
+        parser._CommitMessageParser__parser, 'parse', slow_parse
+    )
+    parser.parse('feat(api)!: slow\n\nbody')
+    commit = parser.commit
+    assert commit.type == 'feat'
+    assert commit.scope == 'api'
+    assert commit.is_breaking
+    assert commit.degraded
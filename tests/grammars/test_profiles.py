@@ -0,0 +1,78 @@
+# type: ignore
+"""Test commit message profiles."""
+
+import pytest
+
+from versioning.exception import VersioningException
+from versioning.grammars.conventional_commits import CommitMessageParser
+from versioning.grammars.registry import detect_profile, get_profile
+
+
+def test_profile_unknown():
+    """Test unknown profiles are rejected."""
+    with pytest.raises(VersioningException):
+        get_profile('unknown')
+
+
+def test_profile_angular():
+    """Test angular commit messages."""
+    parser = CommitMessageParser(profile='angular')
+    parser.parse('perf(core): faster\n\nBREAKING CHANGE: removed cache')
+    assert parser.commit.type == 'perf'
+    assert parser.commit.scope == 'core'
+    assert parser.commit.breaking_change == 'removed cache'
+
+
+@pytest.mark.parametrize(
+    'message, kind, breaking',
+    [
+        (':sparkles: add feature', 'feat', False),
+        ('✨ add feature', 'feat', False),
+        ('\U0001f691️ hotfix', 'fix', False),
+        (':boom: remove api', 'feat', True),
+        (':unknown_emoji: something', 'chore', False),
+    ],
+)
+def test_profile_gitmoji(message, kind, breaking):
+    """Test gitmoji intentions map to commit types."""
+    parser = CommitMessageParser(profile='gitmoji')
+    parser.parse(message)
+    assert parser.commit.type == kind
+    assert parser.commit.is_breaking is breaking
+
+
+def test_profile_ticket():
+    """Test ticket prefixed commit messages."""
+    parser = CommitMessageParser(profile='ticket')
+    parser.parse('ABC-123: add login page')
+    assert parser.commit.type is None
+    assert parser.commit.description == 'add login page'
+    assert parser.commit.issues == (('Refs', 'ABC-123'),)
+
+    parser.parse('[ABC-12] fix(ui): broken button')
+    assert parser.commit.type == 'fix'
+    assert parser.commit.scope == 'ui'
+    assert parser.commit.issues == (('Refs', 'ABC-12'),)
+
+
+def test_profile_tolerant():
+    """Test messages of another convention skip the grammar."""
+    parser = CommitMessageParser(profile='ticket')
+    parser.parse('fix: not a ticket', header_only=True, tolerant=True)
+    assert parser.commit.status == 'unparseable'
+
+
+@pytest.mark.parametrize(
+    'messages, profile',
+    [
+        (['fix: a', 'feat(ui): b', 'Merge branch c'], 'conventional'),
+        (['feat: a', 'fix: b'], 'conventional'),
+        ([':bug: a', '✨ b', 'fix: c'], 'gitmoji'),
+        (['ABC-1: a', '[ABC-2] fix: b', 'fix: c'], 'ticket'),
+        (['Initial commit', 'Update readme'], 'conventional'),
+        ([], 'conventional'),
+    ],
+)
+def test_detect_profile(messages, profile):
+    """Test profiles are detected from sampled messages."""
+    assert detect_profile(messages) == profile
@@ -0,0 +1,58 @@
+# type: ignore
+"""Test parser registry."""
+
+import os
+
+from versioning.grammars.registry import (
+    _write_cache,
+    clear_parsers,
+    get_parser,
+)
+
+
+def test_registry_shared_parser(tmp_path):
+    """Test parsers are compiled once per process."""
+    clear_parsers()
+    parser = get_parser(cache_dir=str(tmp_path), start='message')
+    assert get_parser(cache_dir=str(tmp_path), start='message') is parser
+
+
+def test_registry_disk_cache(tmp_path):
+    """Test analyzed grammar is persisted and reused."""
+    clear_parsers()
+    get_parser(cache_dir=str(tmp_path), start='message')
+    cache_files = os.listdir(tmp_path)
+    assert len(cache_files) == 1
+    assert cache_files[0].startswith('grammar-')
+
+    clear_parsers()
+    parser = get_parser(cache_dir=str(tmp_path), start='message')
+    assert os.listdir(tmp_path) == cache_files
+    tree = parser.parse('fix: test')
+    assert tree.children[0].data == 'title'
+
+
+def test_registry_lalr_cache(tmp_path):
+    """Test LALR parse tables are persisted and reused."""
+    clear_parsers()
+    get_parser(cache_dir=str(tmp_path), start='message', parser='lalr')
+    cache_files = os.listdir(tmp_path)
+    assert cache_files[0].startswith('parser-')
+
+    clear_parsers()
+    parser = get_parser(
+        cache_dir=str(tmp_path), start='message', parser='lalr'
+    )
+    assert parser.parse('fix: test').children[0].data == 'title'
+
+
+def test_registry_cache_failure(tmp_path):
+    """Test temporary files are removed when a cache write fails."""
+
+    def dump(file):
+        file.write(b'partial')
+        raise ValueError('unable to dump')
+
+    cache_path = str(tmp_path / 'grammar-test.pickle')
+    _write_cache(cache_path, dump)
+    assert os.listdir(tmp_path) == []
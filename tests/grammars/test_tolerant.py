@@ -0,0 +1,102 @@
+# type: ignore
+"""Test tolerant parsing of nonconforming commit messages."""
+
+import pytest
+from lark.exceptions import LarkError
+
+from versioning.grammars.conventional_commits import (
+    CommitMessageParser,
+    ParseStats,
+)
+
+messages = [
+    'fix: test',
+    'Merge branch feature into master',
+    'feat(ui): valid title\n\n<<< unparseable body >>>',
+    'Initial commit',
+    'fix (ui) : test\n\n<<< unparseable body >>>',
+]
+
+
+def test_parse_strict():
+    """Test nonconforming messages raise by default."""
+    parser = CommitMessageParser()
+    with pytest.raises(LarkError):
+        parser.parse(messages[2])
+
+
+def test_parse_tolerant():
+    """Test nonconforming messages are recovered or left unclassified."""
+    parser = CommitMessageParser()
+    parser.parse(messages[2], tolerant=True)
+    assert parser.commit.type == 'feat'
+    assert parser.commit.scope == 'ui'
+    assert parser.commit.status == 'recovered'
+
+    parser.parse(messages[3], tolerant=True)
+    assert parser.commit.type is None
+    assert parser.commit.description == 'Initial commit'
+    assert parser.commit.status == 'conforming'
+
+    parser.parse(messages[4], tolerant=True)
+    assert parser.commit.type is None
+    assert parser.commit.status == 'unparseable'
+
+
+def test_parse_tolerant_breaking_change():
+    """Test breaking changes of messages without a type are kept."""
+    parser = CommitMessageParser()
+    parser.parse(
+        'Drop legacy config\n\nBREAKING CHANGE: config is removed',
+        tolerant=True,
+    )
+    assert parser.commit.type is None
+    assert parser.commit.breaking_change == 'config is removed'
+    assert parser.commit.is_breaking
+    assert parser.commit.status == 'conforming'
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_parse_many_stats(workers):
+    """Test statistics of tolerant batch parsing."""
+    parser = CommitMessageParser()
+    stats = ParseStats()
+    records = list(
+        parser.parse_many(
+            messages * 4,
+            workers=workers,
+            chunksize=3,
+            tolerant=True,
+            stats=stats,
+        )
+    )
+    assert [x.status for x in records[:5]] == [
+        'conforming',
+        'conforming',
+        'recovered',
+        'conforming',
+        'unparseable',
+    ]
+    assert stats.total == 20
+    assert stats.conforming == 12
+    assert stats.recovered == 4
+    assert stats.unparseable == 4
+    assert stats.elapsed > 0
+
+
+def test_parse_tolerant_footer():
+    """Test issues and trailers of recovered messages are kept."""
+    parser = CommitMessageParser()
+    parser.parse(
+        'fix(ui): valid title\n\n<<< unparseable body >>>\n\n'
+        'Refs #123\nReviewed-by: Jane Doe <jane@example.com>',
+        tolerant=True,
+    )
+    assert parser.commit.status == 'recovered'
+    assert parser.commit.issues == (('Refs', '123'),)
+    assert parser.commit.trailers == (
+        ('Reviewed-by', 'Jane Doe', 'jane@example.com'),
+    )
+
+    parser.parse('Update readme\n\nCloses #ABC-124', tolerant=True)
+    assert parser.commit.issues == (('Closes', 'ABC-124'),)
@@ -0,0 +1,55 @@
+# type: ignore
+"""Test commit cache."""
+
+import os
+
+from versioning.cache import CommitCache, get_commit_cache
+from versioning.grammars.conventional_commits import CommitMessageParser
+
+
+def parse(message):
+    """Parse commit message."""
+    parser = CommitMessageParser()
+    parser.parse(message)
+    return parser.commit
+
+
+def test_commit_cache(tmp_path):
+    """Test parsed commits are persisted by commit id."""
+    path = os.path.join(tmp_path, 'versioning', 'commits.db')
+    commit = parse(
+        'fix(ui): test\n\n'
+        'Reviewed-by: Jim Henson <jim.henson@email.com>\n'
+        'Refs #123'
+    )
+    with CommitCache(path, grammar='1') as cache:
+        assert cache.get('a' * 40) is None
+        cache.set('a' * 40, commit)
+
+    with CommitCache(path, grammar='1') as cache:
+        assert cache.get('a' * 40) == commit
+        assert cache.stats()['hits'] == 1
+
+    with CommitCache(path, grammar='2') as cache:
+        assert cache.get('a' * 40) is None
+
+
+def test_commit_cache_eviction(tmp_path):
+    """Test least recently used commits are evicted."""
+    path = os.path.join(tmp_path, 'commits.db')
+    with CommitCache(path, grammar='1', max_entries=2) as cache:
+        for x in range(3):
+            cache.set(str(x), parse(f"fix: change {x}"))
+        cache.flush()
+        assert cache.stats()['entries'] == 2
+        assert cache.get('0') is None
+        cache.clear()
+        assert cache.stats()['entries'] == 0
+
+
+def test_commit_cache_key(tmp_path):
+    """Test commits classified by another parser are not shared."""
+    earley = get_commit_cache(str(tmp_path))
+    lalr = get_commit_cache(str(tmp_path), parser='lalr')
+    assert earley.grammar != lalr.grammar
+    assert earley.grammar == get_commit_cache(str(tmp_path)).grammar
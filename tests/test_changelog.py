@@ -0,0 +1,295 @@
+# type: ignore
+"""Test changelog generation."""
+
+import json
+import os
+
+import pytest
+
+from versioning.cache import CommitCache
+from versioning.changelog import Changelog
+from versioning.grammars.conventional_commits import CommitMessageParser
+
+
+def test_changelog(git_repo, tmp_path, monkeypatch):
+    """Test changelog sections are rendered per release."""
+    monkeypatch.chdir(tmp_path)
+    git_repo.commit('feat: first feature')
+    git_repo.tag('0.1.0')
+    git_repo.commit('fix: first fix')
+    git_repo.commit('Update readme')
+    git_repo.tag('0.1.1')
+
+    Changelog(git_repo.repo).generate_changelog()
+    with open('CHANGELOG.md') as file:
+        document = file.read()
+    assert document.startswith(
+        '\nChangelog\n=========\n\n# ProMan Versioning Changelog\n\n## v0.1.1'
+    )
+    assert document.index('v0.1.1') < document.index('v0.1.0')
+    assert 'first feature' in document
+    assert '### fixed' in document
+    assert '### misc' in document
+
+
+def test_changelog_incremental(git_repo, tmp_path, monkeypatch):
+    """Test earlier releases are reused from the cache."""
+    monkeypatch.chdir(tmp_path)
+    path = os.path.join(tmp_path, 'commits.db')
+    git_repo.commit('feat: first feature')
+    git_repo.tag('0.1.0')
+    with CommitCache(path, grammar='1') as cache:
+        changelog = Changelog(git_repo.repo, cache=cache)
+        changelog.generate_changelog()
+        assert changelog.stats.total == 1
+
+    git_repo.commit('fix: first fix')
+    git_repo.commit('fix: second fix')
+    git_repo.tag('0.1.1')
+    with CommitCache(path, grammar='1') as cache:
+        changelog = Changelog(git_repo.repo, cache=cache)
+        changelog.generate_changelog()
+        assert changelog.stats.total == 2
+        assert cache.stats()['releases'] == 2
+
+    with open('CHANGELOG.md') as file:
+        document = file.read()
+    assert 'first feature' in document
+    assert 'second fix' in document
+
+
+def test_changelog_degraded(git_repo, tmp_path, monkeypatch):
+    """Test degraded commits are not cached."""
+    monkeypatch.chdir(tmp_path)
+    path = os.path.join(tmp_path, 'commits.db')
+    git_repo.commit('feat: first feature')
+    git_repo.commit('fix (ui) : ' + 'x' * 200)
+    git_repo.tag('0.1.0')
+    with CommitCache(path, grammar='1') as cache:
+        Changelog(
+            git_repo.repo,
+            cache=cache,
+            parser=CommitMessageParser(max_title_length=100),
+        ).generate_changelog()
+        assert cache.stats()['entries'] == 1
+
+
+def test_changelog_since(git_repo, tmp_path, monkeypatch):
+    """Test only commits after a revision are categorized."""
+    monkeypatch.chdir(tmp_path)
+    path = os.path.join(tmp_path, 'commits.db')
+    git_repo.commit('feat: first feature')
+    git_repo.tag('0.1.0')
+    with CommitCache(path, grammar='1') as cache:
+        Changelog(git_repo.repo, cache=cache).generate_changelog()
+
+    git_repo.commit('fix: first fix')
+    git_repo.tag('0.1.1')
+    with CommitCache(path, grammar='1') as cache:
+        changelog = Changelog(git_repo.repo, cache=cache)
+        changelog.generate_changelog(since='0.1.0')
+        assert changelog.stats.total == 1
+    with open('CHANGELOG.md') as file:
+        document = file.read()
+    assert 'first fix' in document
+    assert 'first feature' in document
+
+
+def test_changelog_since_uncached(git_repo, tmp_path, monkeypatch):
+    """Test uncached releases before a revision are not dropped."""
+    monkeypatch.chdir(tmp_path)
+    git_repo.commit('feat: first feature')
+    git_repo.tag('0.1.0')
+    git_repo.commit('fix: first fix')
+    git_repo.tag('0.1.1')
+    git_repo.commit('fix: second fix')
+    git_repo.tag('0.1.2')
+
+    changelog = Changelog(git_repo.repo)
+    changelog.generate_changelog(since='0.1.1')
+    assert changelog.stats.total == 3
+    with open('CHANGELOG.md') as file:
+        document = file.read()
+    assert document.index('v0.1.2') < document.index('v0.1.1')
+    assert document.index('v0.1.1') < document.index('v0.1.0')
+    assert document.count('first fix') == 1
+
+
+def test_changelog_lightweight_tags(git_repo, tmp_path, monkeypatch):
+    """Test lightweight tags bound releases."""
+    monkeypatch.chdir(tmp_path)
+    git_repo.commit('feat: first feature')
+    git_repo.tag('0.1.0', annotated=False)
+    git_repo.commit('fix: first fix')
+    git_repo.tag('0.1.1', annotated=False)
+    git_repo.commit('fix: unreleased fix')
+
+    changelog = Changelog(git_repo.repo)
+    changelog.generate_changelog()
+    assert changelog.stats.total == 2
+    with open('CHANGELOG.md') as file:
+        document = file.read()
+    assert document.index('first fix') < document.index('first feature')
+    assert 'unreleased fix' not in document
+
+
+def test_changelog_workers(git_repo, tmp_path, monkeypatch):
+    """Test releases categorized across processes keep their order."""
+    monkeypatch.chdir(tmp_path)
+    for release in range(5):
+        for change in range(3):
+            git_repo.commit(f"fix: change {release}.{change}")
+        git_repo.tag(f"0.{release}.0")
+
+    Changelog(git_repo.repo).generate_changelog()
+    with open('CHANGELOG.md') as file:
+        expected = file.read()
+
+    changelog = Changelog(git_repo.repo)
+    changelog.generate_changelog(workers=2)
+    assert changelog.stats.total == 15
+    with open('CHANGELOG.md') as file:
+        assert file.read() == expected
+
+
+def test_changelog_merged_release(git_repo, tmp_path, monkeypatch):
+    """Test releases only cover commits unreachable from earlier releases."""
+    monkeypatch.chdir(tmp_path)
+    base = git_repo.commit('feat: base')
+    git_repo.tag('0.1.0')
+    branch = git_repo.commit('fix: on branch', parents=[base])
+    main = git_repo.commit('fix: on main', parents=[base])
+    git_repo.tag('0.1.1', oid=main)
+    git_repo.commit('feat: merge branch', parents=[main, branch])
+    git_repo.tag('0.2.0')
+
+    Changelog(git_repo.repo).generate_changelog()
+    with open('CHANGELOG.md') as file:
+        document = file.read()
+    releases = document.split('## v')
+    assert 'on branch' in releases[1] and 'on main' not in releases[1]
+    assert 'on main' in releases[2] and 'on branch' not in releases[2]
+    assert 'base' in releases[3]
+
+
+def test_changelog_failure(git_repo, tmp_path, monkeypatch):
+    """Test failed generation keeps the existing changelog."""
+    monkeypatch.chdir(tmp_path)
+    with open('CHANGELOG.md', 'w') as file:
+        file.write('existing')
+    git_repo.commit('feat: first feature')
+    git_repo.tag('0.1.0')
+
+    changelog = Changelog(git_repo.repo)
+
+    def fail(*args, **kwargs):
+        raise RuntimeError('failed')
+        yield
+
+    monkeypatch.setattr(changelog.parser, 'parse_many', fail)
+    with pytest.raises(RuntimeError):
+        changelog.generate_changelog()
+    with open('CHANGELOG.md') as file:
+        assert file.read() == 'existing'
+    assert sorted(os.listdir(tmp_path)) == ['CHANGELOG.md', 'repo']
+
+
+def test_changelog_update(git_repo, tmp_path, monkeypatch):
+    """Test new releases are spliced into an existing changelog."""
+    monkeypatch.chdir(tmp_path)
+    git_repo.commit('feat: first feature')
+    git_repo.tag('0.1.0')
+    Changelog(git_repo.repo).generate_changelog()
+    with open('CHANGELOG.md', 'a') as file:
+        file.write('\nEdited by hand.\n')
+
+    git_repo.commit('fix: first fix')
+    git_repo.tag('0.1.1')
+    git_repo.commit('feat: second feature')
+    git_repo.tag('0.2.0')
+    changelog = Changelog(git_repo.repo)
+    changelog.update_changelog()
+    assert changelog.stats.total == 2
+
+    with open('CHANGELOG.md') as file:
+        document = file.read()
+    assert document.endswith('\nEdited by hand.\n')
+    assert (
+        document.index('v0.2.0')
+        < document.index('second feature')
+        < document.index('v0.1.1')
+        < document.index('first fix')
+        < document.index('v0.1.0')
+    )
+    assert document.count('first feature') == 1
+
+    changelog = Changelog(git_repo.repo)
+    changelog.update_changelog()
+    assert changelog.stats.total == 0
+    with open('CHANGELOG.md') as file:
+        assert file.read() == document
+
+
+def test_changelog_update_json(git_repo, tmp_path, monkeypatch):
+    """Test new releases are spliced into a JSON changelog."""
+    monkeypatch.chdir(tmp_path)
+    git_repo.commit('feat: first feature')
+    git_repo.tag('0.1.0')
+    Changelog(git_repo.repo, renderer='json').generate_changelog()
+    git_repo.commit('fix: first fix')
+    git_repo.tag('0.1.1')
+    Changelog(git_repo.repo, renderer='json').update_changelog()
+
+    with open('CHANGELOG.json') as file:
+        document = json.load(file)
+    assert [x['name'] for x in document['releases']] == ['0.1.1', '0.1.0']
+
+
+def test_changelog_update_missing(git_repo, tmp_path, monkeypatch):
+    """Test changelog is generated when it has no known release."""
+    monkeypatch.chdir(tmp_path)
+    git_repo.commit('feat: first feature')
+    git_repo.tag('0.1.0')
+    with open('CHANGELOG.md', 'w') as file:
+        file.write('# Changelog\n')
+    Changelog(git_repo.repo).update_changelog()
+
+    with open('CHANGELOG.md') as file:
+        document = file.read()
+    assert 'ProMan Versioning Changelog' in document
+    assert 'first feature' in document
+
+
+def test_changelog_update_unchanged(git_repo, tmp_path, monkeypatch):
+    """Test update is skipped until HEAD, tags or the file change."""
+    monkeypatch.chdir(tmp_path)
+    path = os.path.join(tmp_path, 'commits.db')
+    git_repo.commit('feat: first feature')
+    git_repo.tag('0.1.0')
+    with CommitCache(path, grammar='1') as cache:
+        assert Changelog(git_repo.repo, cache=cache).update_changelog()
+        changelog = Changelog(git_repo.repo, cache=cache)
+        assert not changelog.update_changelog()
+
+        git_repo.commit('fix: first fix')
+        assert changelog.update_changelog()
+        assert not changelog.update_changelog()
+
+        git_repo.tag('0.1.1')
+        assert changelog.update_changelog()
+        os.remove('CHANGELOG.md')
+        assert changelog.update_changelog()
+
+    with open('CHANGELOG.md') as file:
+        assert 'first fix' in file.read()
+
+
+def test_changelog_first_release(git_repo):
+    """Test first release containing a commit is resolved."""
+    git_repo.commit('feat: first feature')
+    git_repo.tag('0.1.0')
+    git_repo.commit('fix: first fix')
+    git_repo.tag('v0.1.1')
+    changelog = Changelog(git_repo.repo)
+    assert changelog.first_release('HEAD~1') == '0.1.0'
+    assert changelog.first_release('HEAD') == 'v0.1.1'
@@ -0,0 +1,30 @@
+# type: ignore
+"""Test command line interface."""
+
+import json
+import os
+import subprocess  # nosec
+import sys
+
+import versioning
+
+
+def test_parse_stdin_without_repository(tmp_path):
+    """Test commit messages are parsed outside of a git repository."""
+    env = dict(
+        os.environ,
+        GIT_CEILING_DIRECTORIES=str(tmp_path.parent),
+        PYTHONPATH=os.path.dirname(os.path.dirname(versioning.__file__)),
+    )
+    result = subprocess.run(  # nosec
+        [sys.executable, '-m', 'versioning', 'parse', '--stdin'],
+        input=b'a' * 40 + b'\0fix(ui): test\0',
+        cwd=tmp_path,
+        env=env,
+        capture_output=True,
+        check=True,
+    )
+    commit = json.loads(result.stdout)
+    assert commit['oid'] == 'a' * 40
+    assert commit['type'] == 'fix'
+    assert commit['scope'] == 'ui'
@@ -4,7 +4,7 @@
 import os
 from unittest.mock import Mock, mock_open, patch
 
-from versioning import ReleaseController, Version
+from versioning import ReleaseController, Version, controller
 from versioning.config import Config
 from versioning.vcs import Git
 
@@ -57,3 +57,56 @@ def test_create_devrelease(mock_file):
         dry_run=True,
     )
     assert controller.config.version == Version('1.3.0.dev0')
+
+
+def test_update_changelog_dry_run():
+    """Test changelog is not updated for dry runs."""
+    working_dir = os.path.join(os.sep, 'mock', '.git')
+    controller = ReleaseController(
+        repo=Git(Mock(path=working_dir, head={'name': 'mock'})),
+        config=config,
+        message='fix: test',
+    )
+    assert controller.update_changelog(dry_run=True) is False
+
+
+def auto_config():
+    """Get config detecting the commit message profile."""
+    return Config(
+        filepaths=[],
+        defaults={
+            'tool': {
+                'proman': {
+                    'version': '1.2.3',
+                    'versioning': {'profile': 'auto'},
+                }
+            }
+        },
+    )
+
+
+def test_detect_profile_unborn(git_repo):
+    """Test default profile is used before the first commit."""
+    release_controller = ReleaseController(
+        config=auto_config(), repo=Git(git_repo.repo), message='fix: test'
+    )
+    assert release_controller.config.parser.profile == 'conventional'
+
+
+def test_detect_profile_cached(git_repo, monkeypatch):
+    """Test profile is only detected once for each HEAD."""
+    git_repo.commit(':bug: broken button')
+    git_repo.commit(':sparkles: new button')
+    release_controller = ReleaseController(
+        config=auto_config(), repo=Git(git_repo.repo), message=':bug: test'
+    )
+    assert release_controller.config.parser.profile == 'gitmoji'
+
+    def fail(messages):
+        raise AssertionError('profile detected again')
+
+    monkeypatch.setattr(controller, 'detect_profile', fail)
+    release_controller = ReleaseController(
+        config=auto_config(), repo=Git(git_repo.repo), message=':bug: test'
+    )
+    assert release_controller.config.parser.profile == 'gitmoji'
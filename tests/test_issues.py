@@ -0,0 +1,97 @@
+# type: ignore
+"""Test issue and trailer index."""
+
+import os
+
+from versioning.grammars.conventional_commits import CommitMessageParser
+from versioning.issues import IssueIndex
+
+FIX = (
+    'fix: first fix\n\nRefs #12\nCloses #ABC-123\n'
+    'Reviewed-by: Jane Doe <jane@example.com>'
+)
+
+
+def test_issue_index(git_repo, tmp_path):
+    """Test issues are indexed with the release that shipped them."""
+    parser = CommitMessageParser(parser='lalr')
+    path = os.path.join(tmp_path, 'issues.db')
+    git_repo.commit('feat: first feature')
+    git_repo.tag('0.1.0')
+    git_repo.commit(FIX)
+    git_repo.tag('0.1.1')
+    git_repo.commit('fix: second fix\n\nRefs #12')
+
+    with IssueIndex(path, grammar='1') as index:
+        assert index.update(git_repo.repo, parser=parser) == 3
+        references = index.get_release('0.1.1')
+        assert [(x.kind, x.token, x.value) for x in references] == [
+            ('issue', 'Refs', '12'),
+            ('issue', 'Closes', 'ABC-123'),
+            ('trailer', 'Reviewed-by', 'Jane Doe <jane@example.com>'),
+        ]
+        assert [x.release for x in index.find('#12')] == ['0.1.1', None]
+        assert [x.release for x in index.get_release(None)] == [None]
+        assert index.get_release('0.1.0') == []
+
+
+def test_issue_index_trailers(git_repo, tmp_path):
+    """Test trailers are found by token, email and value."""
+    path = os.path.join(tmp_path, 'issues.db')
+    git_repo.commit(FIX)
+    git_repo.tag('0.1.0')
+
+    with IssueIndex(path, grammar='1') as index:
+        index.update(git_repo.repo)
+        for query in (
+            'Reviewed-by',
+            'reviewed-by',
+            'jane@example.com',
+            'Jane Doe <jane@example.com>',
+            'Reviewed-by: jane@example.com',
+        ):
+            (reference,) = index.find(query)
+            assert reference.kind == 'trailer'
+            assert reference.value == 'Jane Doe <jane@example.com>'
+            assert reference.release == '0.1.0'
+        assert index.find('Signed-off-by: jane@example.com') == []
+        assert [x.value for x in index.find('Refs: #12')] == ['12']
+
+
+def test_issue_index_incremental(git_repo, tmp_path):
+    """Test only new commits are parsed and releases are updated."""
+    parser = CommitMessageParser(parser='lalr')
+    path = os.path.join(tmp_path, 'issues.db')
+    git_repo.commit('feat: first feature')
+    git_repo.tag('0.1.0')
+    git_repo.commit(FIX)
+    with IssueIndex(path, grammar='1') as index:
+        assert index.update(git_repo.repo, parser=parser) == 2
+        assert index.find('ABC-123')[0].release is None
+
+    git_repo.tag('0.1.1')
+    git_repo.commit('fix: second fix')
+    with IssueIndex(path, grammar='1') as index:
+        assert index.update(git_repo.repo, parser=parser) == 1
+        assert index.find('ABC-123')[0].release == '0.1.1'
+        assert index.update(git_repo.repo, parser=parser) == 0
+
+
+def test_issue_index_recovered(git_repo, tmp_path):
+    """Test references of untyped and recovered commits are indexed."""
+    path = os.path.join(tmp_path, 'issues.db')
+    git_repo.commit('fix: typed\n\nRefs #123')
+    git_repo.commit('Update readme\n\nRefs #124')
+    git_repo.commit(
+        'fix: recovered\n\nbody with: colons (and parens)\n\n'
+        'Closes #125\nReviewed-by: Jane Doe <jane@example.com>'
+    )
+
+    with IssueIndex(path, grammar='1') as index:
+        assert index.update(git_repo.repo) == 3
+        assert [(x.kind, x.value) for x in index.get_release(None)] == [
+            ('issue', '125'),
+            ('trailer', 'Jane Doe <jane@example.com>'),
+            ('issue', '124'),
+            ('issue', '123'),
+        ]
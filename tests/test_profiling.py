@@ -0,0 +1,74 @@
+# type: ignore
+"""Test memory profiling of pipeline phases."""
+
+import json
+
+from versioning.changelog import Changelog
+from versioning.profiling import MemoryProfiler
+
+
+def test_profiler_phase():
+    """Test allocations within a phase are reported."""
+    with MemoryProfiler(top=3) as profiler:
+        with profiler.phase('allocate'):
+            data = [bytearray(1024) for _ in range(100)]
+    assert data
+    (phase,) = profiler.phases
+    assert phase.name == 'allocate'
+    assert phase.allocated >= 100 * 1024
+    assert phase.peak >= phase.allocated
+    assert len(phase.sites) <= 3
+    assert phase.sites[0].site.startswith(__file__)
+    assert json.loads(profiler.as_json())['phases'][0]['name'] == 'allocate'
+    assert profiler.as_table().splitlines()[1].startswith('allocate')
+
+
+def test_profiler_changelog(git_repo, tmp_path, monkeypatch):
+    """Test phases of changelog generation are profiled."""
+    monkeypatch.chdir(tmp_path)
+    git_repo.commit('feat: first feature')
+    git_repo.tag('0.1.0')
+    with MemoryProfiler() as profiler:
+        Changelog(git_repo.repo, profiler=profiler).generate_changelog()
+    assert [x.name for x in profiler.phases] == [
+        'tags',
+        'render',
+        'classify',
+        'walk',
+        'flush',
+    ]
+    assert all(x.rss_delta is not None for x in profiler.phases)
+    assert json.loads(profiler.as_json())['peak_rss'] > 0
+
+
+def test_profiler_nested():
+    """Test allocations of nested phases are only counted once."""
+    with MemoryProfiler() as profiler:
+        with profiler.phase('outer'):
+            with profiler.phase('inner'):
+                data = [bytearray(1024) for _ in range(100)]
+            with profiler.phase('inner'):
+                data += [bytearray(1024) for _ in range(100)]
+    outer, inner = profiler.phases
+    assert inner.allocated >= 200 * 1024
+    assert outer.allocated < 100 * 1024
+    assert data
+
+
+def test_profiler_track():
+    """Test items of a streamed iterable are profiled as they are taken."""
+
+    def produce():
+        for _ in range(100):
+            yield bytearray(1024)
+
+    with MemoryProfiler() as profiler:
+        with profiler.phase('consume'):
+            data = [
+                (x, bytes(2048)) for x in profiler.track('produce', produce())
+            ]
+    consume, produce = profiler.phases
+    assert produce.allocated >= 100 * 1024
+    assert consume.allocated >= 100 * 2048
+    assert consume.allocated < 100 * 3072
+    assert data
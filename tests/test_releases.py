@@ -0,0 +1,32 @@
+# type: ignore
+"""Test release containment index."""
+
+import os
+
+from versioning.releases import ReleaseIndex
+
+
+def test_release_index(git_repo, tmp_path):
+    """Test commits resolve to the first release containing them."""
+    first = git_repo.commit('feat: first feature')
+    git_repo.tag('0.1.0')
+    second = git_repo.commit('fix: first fix')
+    branch = git_repo.commit('fix: second fix')
+    git_repo.tag('0.2.0')
+    unreleased = git_repo.commit('fix: third fix')
+
+    with ReleaseIndex(os.path.join(tmp_path, 'releases.db')) as index:
+        assert index.update(git_repo.repo) == 3
+        assert index.get(str(first)) == '0.1.0'
+        assert index.get(str(second)) == '0.2.0'
+        assert index.first_release(git_repo.repo, str(branch)) == '0.2.0'
+        assert index.first_release(git_repo.repo, str(unreleased)) is None
+        assert index.update(git_repo.repo) == 0
+
+        # NOTE: a release tagged later between existing releases
+        git_repo.tag('0.1.1', oid=second)
+        assert index.first_release(git_repo.repo, str(second)) == '0.1.1'
+        assert index.get(str(branch)) == '0.2.0'
+
+        git_repo.repo.references.delete('refs/tags/0.1.1')
+        assert index.first_release(git_repo.repo, str(second)) == '0.2.0'
@@ -0,0 +1,61 @@
+# type: ignore
+"""Test changelog renderers."""
+
+import io
+import json
+
+import pytest
+
+from versioning.changelog import Changelog
+from versioning.exception import VersioningException
+from versioning.renderers import get_renderer
+
+
+@pytest.fixture
+def history(git_repo):
+    """Get repository with two releases."""
+    git_repo.commit('feat: first feature')
+    git_repo.tag('v0.1.0')
+    git_repo.commit('fix(ui): first fix')
+    git_repo.commit('Update readme')
+    git_repo.tag('0.1.1', annotated=False)
+    return git_repo.repo
+
+
+def test_renderer_unknown():
+    """Test unknown formats are rejected."""
+    with pytest.raises(VersioningException):
+        get_renderer('html')
+
+
+def test_renderer_json(history):
+    """Test changelog is rendered as a JSON document."""
+    file = io.StringIO()
+    Changelog(history, renderer='json').write_changelog(file)
+    document = json.loads(file.getvalue())
+    assert [x['name'] for x in document['releases']] == ['0.1.1', 'v0.1.0']
+    assert document['releases'][1]['version'] == '0.1.0'
+    fixed = document['releases'][0]['sections']['fixed']
+    assert fixed[0]['type'] == 'fix'
+    assert fixed[0]['description'] == 'first fix'
+    assert 'added' not in document['releases'][0]['sections']
+
+
+def test_renderer_json_empty(git_repo):
+    """Test changelog without releases is valid JSON."""
+    git_repo.commit('feat: unreleased')
+    file = io.StringIO()
+    Changelog(git_repo.repo, renderer='json').write_changelog(file)
+    assert json.loads(file.getvalue())['releases'] == []
+
+
+def test_renderer_ndjson(history, tmp_path, monkeypatch):
+    """Test changelog is rendered as one JSON object per release."""
+    monkeypatch.chdir(tmp_path)
+    Changelog(history, renderer='ndjson').generate_changelog()
+    with open('CHANGELOG.ndjson') as file:
+        releases = [json.loads(x) for x in file]
+    assert [x['name'] for x in releases] == ['0.1.1', 'v0.1.0']
+    assert releases[0]['sections']['misc'][0]['description'] == (
+        'Update readme'
+    )
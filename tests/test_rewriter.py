@@ -0,0 +1,294 @@
+# type: ignore
+"""Test version rewriter."""
+
+import difflib
+import io
+import json
+import os
+
+import pytest
+
+from versioning import ReleaseController, controller
+from versioning.config import Config
+from versioning.exception import VersioningException
+from versioning.rewriter import (
+    Rewriter,
+    RewriteState,
+    RewriteTransaction,
+    rewrite_lines,
+    scan_file,
+)
+from versioning.vcs import Git
+
+CHART = 'version: "1.2.3"\nappVersion: "1.2.3"\nkubeVersion: "1.2.3"\n'
+
+
+def test_rewriter_patterns():
+    """Test every pattern of a file is applied in a single scan."""
+    rewriter = Rewriter(
+        ['version: "${version}"', 'appVersion: "${version}"'], '1.2.3'
+    )
+    text, counts = rewriter.sub(CHART, '1.3.0')
+    assert text == (
+        'version: "1.3.0"\nappVersion: "1.3.0"\nkubeVersion: "1.2.3"\n'
+    )
+    assert counts == [1, 1]
+
+
+def test_rewriter_counts():
+    """Test patterns without matches are counted."""
+    rewriter = Rewriter(
+        ['version = "${version}"', 'appVersion: "${version}"'], '1.2.3'
+    )
+    text, counts = rewriter.sub('version = "1.2.3"\nversion = "1.2.3"\n', '2')
+    assert text == 'version = "2"\nversion = "2"\n'
+    assert counts == [2, 0]
+
+
+def test_rewriter_backreference():
+    """Test patterns with backreferences are applied separately."""
+    rewriter = Rewriter(
+        ["version = ([\"'])${version}\\1", 'appVersion: "${version}"'],
+        '1.2.3',
+    )
+    assert rewriter.regex is None
+    text, counts = rewriter.sub(
+        'version = \'1.2.3\'\nversion = "1.2.3\'\nappVersion: "1.2.3"\n',
+        '1.3.0',
+    )
+    lines = text.splitlines()
+    assert counts == [1, 1]
+    assert lines[0].endswith("1.3.0'")
+    assert lines[1:] == ['version = "1.2.3\'', 'appVersion: "1.3.0"']
+
+
+def test_rewriter_group_names():
+    """Test patterns sharing group names are applied separately."""
+    rewriter = Rewriter(['(?P<k>v): ${version}', '(?P<k>w): ${version}'], '1')
+    assert rewriter.regex is None
+    text, counts = rewriter.sub('v: 1\nw: 1\nx: 1\n', '2')
+    assert counts == [1, 1]
+    assert [x[-1] for x in text.splitlines()] == ['2', '2', '1']
+
+
+def test_config_rewriter_cache():
+    """Test patterns are compiled once per version query."""
+    config = Config(filepaths=[], defaults={'proman': {'version': '1.2.3'}})
+    template = {
+        'filepath': 'chart/Chart.yaml',
+        'patterns': ['version: "${version}"', 'appVersion: "${version}"'],
+    }
+    rewriter = config.get_rewriter(template, '1.2.3')
+    assert config.get_rewriter(template, '1.2.3') is rewriter
+    assert config.get_rewriter(template, '1.2.4') is not rewriter
+
+
+def test_transaction_commit(tmp_path):
+    """Test staged files replace their targets on commit."""
+    path = tmp_path / 'VERSION'
+    path.write_text('1.2.3\n')
+    with RewriteTransaction() as transaction:
+        transaction.stage(str(path), '1.3.0\n')
+        assert path.read_text() == '1.2.3\n'
+    assert path.read_text() == '1.3.0\n'
+    assert os.listdir(tmp_path) == ['VERSION']
+
+
+def test_transaction_restore(tmp_path, monkeypatch):
+    """Test replaced files are restored when a replacement fails."""
+    first, second = tmp_path / 'first', tmp_path / 'second'
+    first.write_text('1.2.3\n')
+    second.write_text('1.2.3\n')
+    transaction = RewriteTransaction()
+    transaction.stage(str(first), '1.3.0\n')
+    transaction.stage(str(second), '1.3.0\n')
+
+    replace = os.replace
+
+    def fail(src, dst):
+        if dst == str(second):
+            raise OSError('disk full')
+        replace(src, dst)
+
+    monkeypatch.setattr(os, 'replace', fail)
+    with pytest.raises(OSError):
+        transaction.commit()
+    monkeypatch.setattr(os, 'replace', replace)
+    assert first.read_text() == '1.2.3\n'
+    assert second.read_text() == '1.2.3\n'
+    assert sorted(os.listdir(tmp_path)) == ['first', 'second']
+
+
+def test_controller_rollback(git_repo):
+    """Test no version file is changed when one is not updated."""
+    git_repo.commit('fix: test')
+    workdir = git_repo.repo.workdir
+    files = {'a.toml': 'version = "1.2.3"\n', 'b.toml': 'version = 1.2.3\n'}
+    for name, content in files.items():
+        with open(os.path.join(workdir, name), 'w') as file:
+            file.write(content)
+    config = Config(
+        filepaths=[],
+        defaults={
+            'tool': {
+                'proman': {
+                    'version': '1.2.3',
+                    'versioning': {
+                        'files': [
+                            {
+                                'filepath': x,
+                                'pattern': 'version = "${version}"',
+                            }
+                            for x in files
+                        ],
+                    },
+                }
+            }
+        },
+    )
+    controller = ReleaseController(
+        config=config, repo=Git(git_repo.repo), message='fix: test'
+    )
+    with pytest.raises(VersioningException):
+        controller.update_version(commit=False)
+    for name, content in files.items():
+        with open(os.path.join(workdir, name)) as file:
+            assert file.read() == content
+    assert sorted(os.listdir(workdir)) == ['.git', 'a.toml', 'b.toml']
+
+    with open(os.path.join(workdir, 'b.toml'), 'w') as file:
+        file.write('version = "1.2.3"\n')
+    controller.update_version(commit=False)
+    for name in files:
+        with open(os.path.join(workdir, name)) as file:
+            assert file.read() == 'version = "1.2.4.dev0"\n'
+
+
+def test_rewrite_lines():
+    """Test streamed rewrite matches the diff of the whole file."""
+    lines = [f"line {i}\n" for i in range(40)]
+    lines[5] = 'version = "1.2.3"\n'
+    lines[9] = 'version = "1.2.3"\n'
+    lines[30] = 'appVersion: "1.2.3"\n'
+    rewriter = Rewriter(
+        ['version = "${version}"', 'appVersion: "${version}"'], '1.2.3'
+    )
+    file = io.StringIO()
+    counts, deltas = rewrite_lines(
+        lines, file, [(rewriter, '1.3.0')], fromfile='test'
+    )
+    assert counts == [[2, 1]]
+
+    text, _ = rewriter.sub(''.join(lines), '1.3.0')
+    assert file.getvalue() == text
+    assert deltas == list(
+        difflib.unified_diff(
+            ''.join(lines).splitlines(), text.splitlines(), fromfile='test'
+        )
+    )
+
+
+def test_controller_stream(git_repo, monkeypatch):
+    """Test large version files are rewritten one line at a time."""
+    monkeypatch.setattr(controller, 'STREAM_SIZE', 0)
+    git_repo.commit('fix: test')
+    path = os.path.join(git_repo.repo.workdir, 'a.toml')
+    with open(path, 'w') as file:
+        file.write('name = "test"\nversion = "1.2.3"\n')
+    config = Config(
+        filepaths=[],
+        defaults={
+            'tool': {
+                'proman': {
+                    'version': '1.2.3',
+                    'versioning': {
+                        'files': [
+                            {
+                                'filepath': 'a.toml',
+                                'pattern': 'version = "${version}"',
+                            }
+                        ],
+                    },
+                }
+            }
+        },
+    )
+    ReleaseController(
+        config=config, repo=Git(git_repo.repo), message='fix: test'
+    ).update_version(commit=False)
+    with open(path) as file:
+        assert file.read() == 'name = "test"\nversion = "1.2.4.dev0"\n'
+
+
+def test_scan_file(tmp_path):
+    """Test version files are scanned for the current version."""
+    path = tmp_path / 'a.toml'
+    path.write_text('version = "1.2.3"\n')
+    assert scan_file(str(path), b'1.2.3') == (True, None)
+    contains, digest = scan_file(str(path), b'1.3.0')
+    assert not contains and len(digest) == 64
+
+    empty = tmp_path / 'empty'
+    empty.write_text('')
+    assert scan_file(str(empty), b'1.2.3')[0] is False
+
+
+def test_rewrite_state(tmp_path):
+    """Test recorded files are only skipped while their content matches."""
+    path = tmp_path / 'a.toml'
+    path.write_text('name = "test"\n')
+    _, digest = scan_file(str(path), b'1.2.3')
+    state = RewriteState(str(tmp_path / 'versioning' / 'rewrites.json'))
+    state.set(str(path), '1.2.3', os.stat(path), digest)
+    state.save()
+
+    state = RewriteState(state.path)
+    assert state.is_unchanged(str(path), '1.2.3', os.stat(path))
+    assert not state.is_unchanged(str(path), '1.3.0', os.stat(path))
+
+    # NOTE: same size with a different mtime is verified by hash
+    os.utime(path, ns=(0, 0))
+    assert state.is_unchanged(str(path), '1.2.3', os.stat(path))
+    path.write_text('name = "tset"\n')
+    assert not state.is_unchanged(str(path), '1.2.3', os.stat(path))
+
+
+def test_controller_skip(git_repo):
+    """Test version files without the current version are skipped."""
+    git_repo.commit('fix: test')
+    workdir = git_repo.repo.workdir
+    files = {'a.toml': 'version = "1.2.3"\n', 'b.toml': 'name = "test"\n'}
+    for name, content in files.items():
+        with open(os.path.join(workdir, name), 'w') as file:
+            file.write(content)
+    config = Config(
+        filepaths=[],
+        defaults={
+            'tool': {
+                'proman': {
+                    'version': '1.2.3',
+                    'versioning': {
+                        'files': [
+                            {
+                                'filepath': x,
+                                'pattern': 'version = "${version}"',
+                            }
+                            for x in files
+                        ],
+                    },
+                }
+            }
+        },
+    )
+    ReleaseController(
+        config=config, repo=Git(git_repo.repo), message='fix: test'
+    ).update_version(commit=False)
+    with open(os.path.join(workdir, 'a.toml')) as file:
+        assert file.read() == 'version = "1.2.4.dev0"\n'
+    with open(os.path.join(workdir, 'b.toml')) as file:
+        assert file.read() == 'name = "test"\n'
+
+    path = os.path.join(git_repo.repo.path, 'versioning', 'rewrites.json')
+    with open(path) as file:
+        state = json.load(file)
+    assert list(state['files']) == [os.path.join(workdir, 'b.toml')]
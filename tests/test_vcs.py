@@ -0,0 +1,152 @@
+# type: ignore
+"""Test git helpers."""
+
+import io
+import os
+
+import pytest
+from pygit2 import GIT_OBJECT_TREE
+
+from versioning.exception import VersioningException
+from versioning.vcs import Git, TagIndex, iter_log_records
+
+
+def test_iter_log_records():
+    """Test reading NUL-delimited git log records."""
+    stream = io.BytesIO(
+        b'a' * 40
+        + b'\0fix: test\n\nbody\n\0\n'
+        + b'b' * 40
+        + b'\0feat: x\n\0\n'
+    )
+    records = list(iter_log_records(stream, size=7))
+    assert records == [
+        ('a' * 40, 'fix: test\n\nbody\n'),
+        ('b' * 40, 'feat: x\n'),
+    ]
+
+
+def test_iter_log_records_incomplete():
+    """Test truncated git log records are rejected."""
+    with pytest.raises(VersioningException):
+        list(iter_log_records(io.BytesIO(b'a' * 40 + b'\0fix: test')))
+
+
+def test_tag_index(git_repo):
+    """Test tags are peeled, parsed and looked up by commit."""
+    first = git_repo.commit('feat: first')
+    git_repo.tag('v0.1.0')
+    second = git_repo.commit('fix: second')
+    git_repo.tag('0.1.1', annotated=False)
+    git_repo.tag('latest', annotated=False)
+    git_repo.repo.create_tag(
+        'tree',
+        git_repo.repo[second].tree_id,
+        GIT_OBJECT_TREE,
+        git_repo.signature(),
+        'tree',
+    )
+    git_repo.commit('docs: unreleased')
+
+    index = TagIndex(git_repo.repo)
+    assert [x.name for x in index] == ['v0.1.0', '0.1.1', 'latest']
+    assert index['v0.1.0'].oid == str(first)
+    assert index['v0.1.0'].annotated
+    assert str(index['v0.1.0'].version) == '0.1.0'
+    assert index['latest'].version is None
+    assert first in index
+    assert git_repo.repo.head.target not in index
+    assert index.get(second).name == 'latest'
+
+
+def test_tag_index_topological(git_repo):
+    """Test tags are ordered by ancestry before time."""
+    base = git_repo.commit('feat: base')
+    child = git_repo.commit('fix: child')
+    git_repo.tag('0.2.0', oid=child)
+    # NOTE: tagged later although its commit is older
+    git_repo.tag('0.1.0', oid=base)
+
+    index = TagIndex(git_repo.repo)
+    assert [x.name for x in index] == ['0.1.0', '0.2.0']
+    assert [x.rank for x in index] == [0, 1]
+
+
+def test_tag_index_frontiers(git_repo):
+    """Test only releases that are not ancestors of others are hidden."""
+    base = git_repo.commit('feat: base')
+    git_repo.tag('0.1.0')
+    branch = git_repo.commit('fix: branch', parents=[base])
+    git_repo.tag('0.1.1', oid=branch)
+    main = git_repo.commit('feat: main', parents=[base])
+    git_repo.tag('0.2.0', oid=main)
+    merge = git_repo.commit('fix: merge', parents=[main, branch])
+    git_repo.tag('0.2.1', oid=merge)
+    git_repo.commit('fix: next')
+    git_repo.tag('0.2.2')
+
+    index = TagIndex(git_repo.repo)
+    releases = index.distinct()
+    frontiers = index.frontiers(releases)
+    assert frontiers[0] == []
+    assert frontiers[1] == [str(base)]
+    assert frontiers[2] == [str(branch)]
+    assert sorted(frontiers[3]) == sorted([str(branch), str(main)])
+    assert frontiers[4] == [str(merge)]
+    assert frontiers[5] == [releases[-1].oid]
+
+    # NOTE: each frontier hides exactly the earlier releases
+    for i, release in enumerate(releases):
+        walks = []
+        for hidden in (frontiers[i], [x.oid for x in releases[:i]]):
+            walker = git_repo.repo.walk(release.oid)
+            for oid in hidden:
+                walker.hide(oid)
+            walks.append({x.id for x in walker})
+        assert walks[0] == walks[1]
+
+
+def test_git_is_clean(git_repo):
+    """Test tracked changes are detected per stage and per path."""
+    repo = git_repo.repo
+    workdir = repo.workdir
+    for name in ('VERSION', 'README'):
+        with open(os.path.join(workdir, name), 'w') as file:
+            file.write('1.0.0\n')
+        repo.index.add(name)
+    repo.index.write()
+    sig = git_repo.signature()
+    repo.create_commit(
+        'HEAD', sig, sig, 'feat: init', repo.index.write_tree(), []
+    )
+    git = Git(repo)
+    assert git.is_clean()
+
+    with open(os.path.join(workdir, 'untracked'), 'w') as file:
+        file.write('test\n')
+    assert git.is_clean()
+    assert git.is_clean(['VERSION', 'missing'])
+
+    with open(os.path.join(workdir, 'README'), 'w') as file:
+        file.write('changed\n')
+    assert not git.is_clean()
+    assert git.is_clean(['VERSION'])
+    assert not git.is_clean([os.path.join(workdir, 'README')])
+
+    repo.index.add('README')
+    repo.index.write()
+    assert not git.is_clean()
+
+
+def test_git_is_clean_unborn(git_repo):
+    """Test staged files are detected before the first commit."""
+    repo = git_repo.repo
+    git = Git(repo)
+    assert git.is_clean()
+    with open(os.path.join(repo.workdir, 'VERSION'), 'w') as file:
+        file.write('1.0.0\n')
+    assert git.is_clean()
+    repo.index.add('VERSION')
+    repo.index.write()
+    assert not git.is_clean()
+    assert not git.is_clean(['VERSION'])